@@ -0,0 +1,45 @@
+"""Replace single-column message indexes with a (session_id, created_at DESC) index
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-15
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '002'
+down_revision: Union[str, None] = '001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Build/drop indexes CONCURRENTLY so the messages table keeps accepting
+    # writes during deploy. CONCURRENTLY cannot run inside a transaction.
+    with op.get_context().autocommit_block():
+        # Serves "WHERE session_id = ? ORDER BY created_at DESC LIMIT n" with
+        # an index range scan and no sort step
+        op.create_index(
+            'ix_messages_session_created',
+            'messages',
+            ['session_id', sa.text('created_at DESC')],
+            postgresql_concurrently=True
+        )
+
+        # session_id lookups (and the ON DELETE CASCADE from sessions) are
+        # covered by the composite index prefix; created_at is never queried
+        # on its own
+        op.drop_index('ix_messages_session_id', table_name='messages', postgresql_concurrently=True)
+        op.drop_index('ix_messages_created_at', table_name='messages', postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_messages_created_at', 'messages', ['created_at'], postgresql_concurrently=True)
+        op.create_index('ix_messages_session_id', 'messages', ['session_id'], postgresql_concurrently=True)
+        op.drop_index('ix_messages_session_created', table_name='messages', postgresql_concurrently=True)
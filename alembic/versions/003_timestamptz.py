@@ -0,0 +1,55 @@
+"""Store created_at/updated_at as TIMESTAMPTZ with server-side now() defaults
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-15
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '003'
+down_revision: Union[str, None] = '002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Existing values were written as naive UTC (datetime.utcnow)
+TIMESTAMP_COLUMNS = [
+    ('sessions', 'created_at'),
+    ('sessions', 'updated_at'),
+    ('messages', 'created_at'),
+    ('feedback', 'created_at'),
+    ('cost_tracking', 'created_at'),
+    ('cost_tracking', 'updated_at'),
+]
+
+
+def upgrade() -> None:
+    for table, column in TIMESTAMP_COLUMNS:
+        op.alter_column(
+            table,
+            column,
+            type_=sa.DateTime(timezone=True),
+            existing_type=sa.DateTime(),
+            existing_nullable=False,
+            server_default=sa.func.now(),
+            postgresql_using=f"{column} AT TIME ZONE 'UTC'",
+        )
+
+
+def downgrade() -> None:
+    for table, column in TIMESTAMP_COLUMNS:
+        op.alter_column(
+            table,
+            column,
+            type_=sa.DateTime(),
+            existing_type=sa.DateTime(timezone=True),
+            existing_nullable=False,
+            server_default=None,
+            postgresql_using=f"{column} AT TIME ZONE 'UTC'",
+        )
@@ -0,0 +1,48 @@
+"""Add partial index on active sessions by IP and index feedback.session_id
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-15
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '004'
+down_revision: Union[str, None] = '003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY keeps the tables writable while the indexes build; it
+    # cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        # Per-IP lookups only care about active sessions; the partial index
+        # stays small. Not unique - one IP can have several open sessions.
+        op.create_index(
+            'ix_sessions_active_ip',
+            'sessions',
+            ['ip_address'],
+            postgresql_where=sa.text('is_active'),
+            postgresql_concurrently=True
+        )
+
+        # PostgreSQL does not index foreign keys automatically; without this
+        # the ON DELETE CASCADE from sessions scans the whole feedback table
+        op.create_index(
+            'ix_feedback_session_id',
+            'feedback',
+            ['session_id'],
+            postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_feedback_session_id', table_name='feedback', postgresql_concurrently=True)
+        op.drop_index('ix_sessions_active_ip', table_name='sessions', postgresql_concurrently=True)
@@ -3,7 +3,8 @@ Application Configuration using Pydantic Settings
 """
 from pydantic_settings import BaseSettings
 from pydantic import Field
-from typing import List, Optional
+from functools import cached_property
+from typing import FrozenSet, Optional
 import os
 
 
@@ -27,6 +28,22 @@ class Settings(BaseSettings):
         ...,
         description="PostgreSQL connection URL with asyncpg driver"
     )
+    db_pool_size: int = Field(
+        default=10,
+        description="Number of persistent connections kept in the database pool"
+    )
+    db_max_overflow: int = Field(
+        default=20,
+        description="Extra connections allowed beyond db_pool_size under load"
+    )
+    db_use_null_pool: bool = Field(
+        default=False,
+        description="Disable app-side pooling (use when DATABASE_URL goes through pgbouncer in transaction mode)"
+    )
+    db_pool_pre_ping: bool = Field(
+        default=False,
+        description="Ping each pooled connection on checkout (one extra round-trip per request)"
+    )
 
     # Application
     environment: str = Field(
@@ -37,6 +54,10 @@ class Settings(BaseSettings):
         default=True,
         description="Enable debug mode"
     )
+    sql_echo: bool = Field(
+        default=False,
+        description="Log every SQL statement (independent of debug mode)"
+    )
     allowed_origins: str = Field(
         default="http://localhost:5173,http://localhost:3000",
         description="Comma-separated list of allowed CORS origins"
@@ -83,6 +104,26 @@ class Settings(BaseSettings):
         default=0.7,
         description="LLM temperature (0-1)"
     )
+    llm_max_retries: int = Field(
+        default=3,
+        description="Retries (exponential backoff, honoring Retry-After) for rate-limited or 5xx Claude calls"
+    )
+    ollama_base_url: Optional[str] = Field(
+        default=None,
+        description="Ollama server URL; when set, casual turns use a local model instead of Claude"
+    )
+    ollama_casual_model: str = Field(
+        default="llama3.2:1b-instruct-q4_K_M",
+        description="Ollama model for casual conversation"
+    )
+    cache_keepalive_enabled: bool = Field(
+        default=False,
+        description="Periodically refresh the prompt cache for recently used portfolio contexts"
+    )
+    cache_keepalive_window_minutes: int = Field(
+        default=60,
+        description="Stop refreshing a context's prompt cache after this long without real traffic"
+    )
 
     # Session Configuration
     session_ttl_hours: int = Field(
@@ -93,18 +134,33 @@ class Settings(BaseSettings):
         default=10,
         description="Number of messages to keep in history"
     )
+    history_token_budget: int = Field(
+        default=2000,
+        description="Approximate input-token budget for history sent to the LLM"
+    )
+    max_history_turns: int = Field(
+        default=6,
+        description="Most recent user/assistant turns sent to the LLM"
+    )
+
+    @cached_property
+    def cors_origins(self) -> FrozenSet[str]:
+        """
+        Parse CORS origins from comma-separated string.
 
-    @property
-    def cors_origins(self) -> List[str]:
-        """Parse CORS origins from comma-separated string"""
-        return [origin.strip() for origin in self.allowed_origins.split(",")]
+        Returned as a frozenset because CORSMiddleware checks each request's
+        Origin header with `in`.
+        """
+        return frozenset(
+            origin.strip() for origin in self.allowed_origins.split(",") if origin.strip()
+        )
 
-    @property
+    @cached_property
     def session_ttl_seconds(self) -> int:
         """Convert session TTL to seconds"""
         return self.session_ttl_hours * 3600
 
-    @property
+    @cached_property
     def async_database_url(self) -> str:
         """
         Convert DATABASE_URL to async format if needed.
@@ -112,7 +168,8 @@ class Settings(BaseSettings):
         Railway provides: postgresql://...
         We need: postgresql+asyncpg://...
 
-        This property automatically converts it.
+        This property automatically converts it. The result is cached
+        after the first access since settings don't change at runtime.
         """
         if self.database_url.startswith("postgresql://"):
             return self.database_url.replace("postgresql://", "postgresql+asyncpg://", 1)
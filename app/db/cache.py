@@ -0,0 +1,115 @@
+"""
+Redis Read-Through Cache for Database Lookups
+
+Small JSON cache in front of hot, read-mostly queries so that every worker
+process shares the same short-lived copy. PostgreSQL stays the system of
+record: entries expire quickly and writers delete the affected keys.
+All operations fail soft - if Redis is unreachable, callers fall through
+to the database.
+"""
+from typing import Any, Optional
+import time
+import orjson
+import redis.asyncio as aioredis
+
+from app.config import settings
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# How long to stop trying Redis after a connection failure
+RETRY_AFTER_SECONDS = 30.0
+
+_client: Optional[aioredis.Redis] = None
+_disabled_until = 0.0
+
+
+def _get_client() -> Optional[aioredis.Redis]:
+    """Get the shared async Redis client, or None while Redis is backing off"""
+    global _client
+
+    if time.monotonic() < _disabled_until:
+        return None
+
+    if _client is None:
+        _client = aioredis.from_url(
+            settings.redis_url,
+            decode_responses=True,
+            socket_connect_timeout=1,  # A cache miss is cheaper than a slow connect
+            socket_timeout=1,
+        )
+    return _client
+
+
+def _back_off(error: Exception):
+    """Skip Redis for a while after a failure"""
+    global _disabled_until
+    _disabled_until = time.monotonic() + RETRY_AFTER_SECONDS
+    logger.warning("Redis cache unavailable, bypassing for %.0fs: %s", RETRY_AFTER_SECONDS, error)
+
+
+async def get_json(key: str) -> Optional[Any]:
+    """
+    Get a cached JSON value.
+
+    Args:
+        key: Cache key
+
+    Returns:
+        Decoded value, or None on a miss or if Redis is unavailable
+    """
+    client = _get_client()
+    if client is None:
+        return None
+
+    try:
+        raw = await client.get(key)
+    except Exception as e:
+        _back_off(e)
+        return None
+
+    return orjson.loads(raw) if raw is not None else None
+
+
+async def set_json(key: str, value: Any, ttl_seconds: int):
+    """
+    Cache a JSON-serializable value with an expiry.
+
+    Args:
+        key: Cache key
+        value: Value to store
+        ttl_seconds: Time to live in seconds
+    """
+    client = _get_client()
+    if client is None:
+        return
+
+    try:
+        await client.set(key, orjson.dumps(value), ex=ttl_seconds)
+    except Exception as e:
+        _back_off(e)
+
+
+async def delete(key: str):
+    """
+    Remove a cached value.
+
+    Args:
+        key: Cache key
+    """
+    client = _get_client()
+    if client is None:
+        return
+
+    try:
+        await client.delete(key)
+    except Exception as e:
+        _back_off(e)
+
+
+async def close_cache():
+    """Close the Redis cache connection"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
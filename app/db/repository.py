@@ -2,17 +2,63 @@
 Database Repository Layer for CRUD Operations
 """
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, desc
-from sqlalchemy.orm import selectinload
-from typing import List, Optional
+from sqlalchemy import select, insert, func, desc, bindparam
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import selectinload, aliased
+from typing import Iterable, List, Optional, Sequence, Tuple
 from datetime import datetime, timedelta
+import time
 
 from app.models.db_models import Session, Message, Feedback, CostTracking
 from app.models.schemas import MessageCreate, SessionCreate, FeedbackCreate
 from app.utils.logger import setup_logger
+from app.utils.dates import today_utc_start
+from app.db import cache
 
 logger = setup_logger(__name__)
 
+# Today's cost tracking row is read by the cost middleware, the budget
+# endpoint and /metrics. Keep the last fetch for a few seconds so a burst of
+# lookups shares a single query. Entry: (day_start, fetched_at, tracking).
+# The same row is also shared across workers through the Redis cache.
+TODAY_TRACKING_TTL_SECONDS = 5.0
+_today_tracking_cache: Optional[Tuple[datetime, float, Optional[dict]]] = None
+
+# Hot-path statements are built once at import and executed with bound
+# parameters, so each request skips statement construction and hits the
+# engine's compiled cache directly
+_SELECT_SESSION_BY_ID = select(Session).where(Session.id == bindparam("session_id"))
+
+_recent_messages = (
+    select(Message)
+    .where(Message.session_id == bindparam("session_id"))
+    .order_by(desc(Message.created_at))
+    .limit(bindparam("limit"))
+    .subquery()
+)
+# Newest N rows, handed back in chronological order
+_SELECT_RECENT_MESSAGES = (
+    select(aliased(Message, _recent_messages))
+    .order_by(_recent_messages.c.created_at)
+)
+
+_COUNT_SESSION_MESSAGES = (
+    select(func.count(Message.id))
+    .where(Message.session_id == bindparam("session_id"))
+)
+
+_SELECT_TRACKING_BY_DATE = (
+    select(
+        CostTracking.total_cost_usd,
+        CostTracking.total_requests,
+        CostTracking.total_tokens,
+        CostTracking.cache_reads,
+        CostTracking.cache_writes,
+    )
+    .where(CostTracking.date == bindparam("day"))
+    .limit(1)
+)
+
 
 class SessionRepository:
     """Repository for Session operations"""
@@ -33,25 +79,50 @@ class SessionRepository:
     @staticmethod
     async def get_session(db: AsyncSession, session_id: str) -> Optional[Session]:
         """Get session by ID"""
-        result = await db.execute(
-            select(Session).where(Session.id == session_id)
-        )
+        result = await db.execute(_SELECT_SESSION_BY_ID, {"session_id": session_id})
         return result.scalar_one_or_none()
 
     @staticmethod
     async def get_or_create_session(
         db: AsyncSession, session_id: str, ip_address: Optional[str] = None, user_agent: Optional[str] = None
     ) -> Session:
-        """Get existing session or create new one"""
-        session = await SessionRepository.get_session(db, session_id)
-        if not session:
-            session_data = SessionCreate(
-                id=session_id,
-                ip_address=ip_address,
-                user_agent=user_agent,
-            )
-            session = await SessionRepository.create_session(db, session_data)
-        return session
+        """
+        Get existing session or create new one.
+
+        Single INSERT ... ON CONFLICT (id) DO UPDATE ... RETURNING, so it costs
+        one round-trip and is safe when concurrent requests share a session_id.
+        An existing session only gets its updated_at bumped.
+        """
+        stmt = pg_insert(Session).values(
+            id=session_id,
+            ip_address=ip_address,
+            user_agent=user_agent,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Session.id],
+            set_={"updated_at": func.now()},
+        ).returning(Session)
+
+        result = await db.execute(stmt, execution_options={"populate_existing": True})
+        return result.scalar_one()
+
+    @staticmethod
+    async def get_sessions_with_messages(
+        db: AsyncSession, session_ids: Sequence[str]
+    ) -> List[Session]:
+        """
+        Get sessions with their messages eagerly loaded.
+
+        Session.messages is lazy="raise", so callers that traverse it must
+        load sessions through here: one query for the sessions and one
+        IN (...) query for all of their messages.
+        """
+        result = await db.execute(
+            select(Session)
+            .options(selectinload(Session.messages))
+            .where(Session.id.in_(session_ids))
+        )
+        return list(result.scalars().all())
 
     @staticmethod
     async def get_session_count(db: AsyncSession) -> int:
@@ -79,19 +150,69 @@ class MessageRepository:
         logger.info(f"Created message: {message.id} for session: {message.session_id}")
         return message
 
+    # Rows per INSERT statement in create_messages_bulk
+    BULK_CHUNK_SIZE = 1000
+
+    # Column order for records passed to copy_messages
+    COPY_COLUMNS = ("session_id", "role", "content", "intent", "tokens_used", "cost_usd")
+
+    @staticmethod
+    async def create_messages_bulk(db: AsyncSession, rows: Sequence[MessageCreate]) -> int:
+        """
+        Insert many messages with one multi-row INSERT ... VALUES per chunk.
+
+        A chat turn's user/assistant pair is a single statement and a single
+        round-trip. Skips the ORM unit of work, so no Message objects are
+        returned.
+
+        Args:
+            db: Database session
+            rows: Messages to insert
+
+        Returns:
+            Number of rows inserted
+        """
+        chunk_size = MessageRepository.BULK_CHUNK_SIZE
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            await db.execute(insert(Message).values([row.model_dump() for row in chunk]))
+
+        logger.info(f"Bulk inserted {len(rows)} messages")
+        return len(rows)
+
+    @staticmethod
+    async def copy_messages(db: AsyncSession, records: Iterable[Tuple]) -> None:
+        """
+        Load messages with PostgreSQL binary COPY, bypassing the ORM.
+
+        Intended for backfills and migrations. created_at is filled in by the
+        column's server default.
+
+        Args:
+            db: Database session (must be backed by asyncpg)
+            records: Tuples in MessageRepository.COPY_COLUMNS order
+        """
+        connection = await db.connection()
+        raw_connection = await connection.get_raw_connection()
+        result = await raw_connection.driver_connection.copy_records_to_table(
+            Message.__tablename__,
+            records=records,
+            columns=MessageRepository.COPY_COLUMNS,
+        )
+        # COPY runs on the raw connection, out of sight of the ORM execute
+        # events, so flag the write for get_db to commit
+        db.info["has_writes"] = True
+        logger.info(f"Copied messages: {result}")
+
     @staticmethod
     async def get_session_messages(
         db: AsyncSession, session_id: str, limit: int = 10
     ) -> List[Message]:
-        """Get recent messages for a session"""
+        """Get recent messages for a session in chronological order"""
         result = await db.execute(
-            select(Message)
-            .where(Message.session_id == session_id)
-            .order_by(desc(Message.created_at))
-            .limit(limit)
+            _SELECT_RECENT_MESSAGES, {"session_id": session_id, "limit": limit}
         )
-        messages = result.scalars().all()
-        return list(reversed(messages))  # Return in chronological order
+        return result.scalars().all()
 
     @staticmethod
     async def get_message_count(db: AsyncSession) -> int:
@@ -102,9 +223,7 @@ class MessageRepository:
     @staticmethod
     async def get_session_message_count(db: AsyncSession, session_id: str) -> int:
         """Get message count for a specific session"""
-        result = await db.execute(
-            select(func.count(Message.id)).where(Message.session_id == session_id)
-        )
+        result = await db.execute(_COUNT_SESSION_MESSAGES, {"session_id": session_id})
         return result.scalar() or 0
 
     @staticmethod
@@ -162,66 +281,154 @@ class CostTrackingRepository:
     @staticmethod
     async def update_daily_cost(
         db: AsyncSession,
-        date: datetime,
+        day_start: datetime,
         tokens: int,
         cost: float,
         is_cache_read: bool = False,
+        count_request: bool = True,
     ):
-        """Update daily cost tracking"""
-        cost_tracking = await CostTrackingRepository.get_or_create_daily_cost(db, date)
+        """
+        Update daily cost tracking.
+
+        Uses a single INSERT ... ON CONFLICT (date) DO UPDATE so the row is
+        created or incremented in one round-trip.
+
+        Args:
+            day_start: Start of the UTC day to charge, from today_utc_start()
+            count_request: False to charge tokens and cost without counting a
+                visitor request (e.g. prompt cache refreshes)
+        """
+        stmt = pg_insert(CostTracking).values(
+            date=day_start,
+            total_requests=int(count_request),
+            total_tokens=tokens,
+            total_cost_usd=cost,
+            cache_reads=int(count_request and is_cache_read),
+            cache_writes=int(count_request and not is_cache_read),
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[CostTracking.date],
+            set_={
+                "total_requests": CostTracking.total_requests + stmt.excluded.total_requests,
+                "total_tokens": CostTracking.total_tokens + stmt.excluded.total_tokens,
+                "total_cost_usd": CostTracking.total_cost_usd + stmt.excluded.total_cost_usd,
+                "cache_reads": CostTracking.cache_reads + stmt.excluded.cache_reads,
+                "cache_writes": CostTracking.cache_writes + stmt.excluded.cache_writes,
+                "updated_at": func.now(),
+            },
+        ).returning(
+            CostTracking.total_requests,
+            CostTracking.total_tokens,
+            CostTracking.total_cost_usd,
+            CostTracking.cache_reads,
+            CostTracking.cache_writes,
+        )
 
-        cost_tracking.total_requests += 1
-        cost_tracking.total_tokens += tokens
-        cost_tracking.total_cost_usd += cost
+        result = await db.execute(stmt)
+        data = CostTrackingRepository._tracking_to_dict(result.one())
 
-        if is_cache_read:
-            cost_tracking.cache_reads += 1
-        else:
-            cost_tracking.cache_writes += 1
+        # Write the new totals through so budget checks stay off Postgres
+        global _today_tracking_cache
+        _today_tracking_cache = (day_start, time.monotonic(), data)
+        await cache.set_json(
+            CostTrackingRepository._tracking_cache_key(day_start),
+            {"tracking": data},
+            int(TODAY_TRACKING_TTL_SECONDS),
+        )
+        logger.info(f"Updated daily cost for {day_start.date()}: ${data['total_cost_usd']:.4f}")
 
-        await db.flush()
-        logger.info(f"Updated daily cost for {date.date()}: ${cost_tracking.total_cost_usd:.4f}")
+    @staticmethod
+    def _tracking_to_dict(tracking) -> dict:
+        """Convert a cost_tracking row to the cached summary dict"""
+        return {
+            "total_tokens": tracking.total_tokens,
+            "cache_read_tokens": tracking.cache_reads,  # Approximate - not exact token count
+            "requests": tracking.total_requests,
+            "total_cost_usd": tracking.total_cost_usd,
+            "cache_writes": tracking.cache_writes
+        }
 
     @staticmethod
-    async def get_today_cost(db: AsyncSession) -> float:
+    def _tracking_cache_key(day_start: datetime) -> str:
+        """Generate Redis key for a day's cost tracking row"""
+        return f"cost:tracking:{day_start.date().isoformat()}"
+
+    @staticmethod
+    async def get_today_cost(db: AsyncSession, day_start: Optional[datetime] = None) -> float:
         """Get today's total cost"""
-        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        result = await db.execute(
-            select(CostTracking.total_cost_usd).where(CostTracking.date == today)
-        )
-        cost = result.scalar_one_or_none()
-        return cost or 0.0
+        summary = await CostTrackingRepository.get_today_summary(db, day_start)
+        return summary["total_cost_usd"]
 
     @staticmethod
-    async def get_today_requests(db: AsyncSession) -> int:
+    async def get_today_requests(db: AsyncSession, day_start: Optional[datetime] = None) -> int:
         """Get today's total requests"""
-        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        result = await db.execute(
-            select(CostTracking.total_requests).where(CostTracking.date == today)
-        )
-        requests = result.scalar_one_or_none()
-        return requests or 0
+        summary = await CostTrackingRepository.get_today_summary(db, day_start)
+        return summary["requests"]
 
     @staticmethod
-    async def get_today_tracking(db: AsyncSession) -> Optional[dict]:
-        """Get today's complete cost tracking data"""
-        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        result = await db.execute(
-            select(CostTracking).where(CostTracking.date == today)
-        )
-        tracking = result.scalar_one_or_none()
-
-        if not tracking:
-            return None
-
+    async def get_today_summary(db: AsyncSession, day_start: Optional[datetime] = None) -> dict:
+        """
+        Get all of today's counters from a single lookup.
+
+        Same fields as get_today_tracking, but zero-filled when no request
+        has been recorded yet so callers can read fields directly.
+        """
+        tracking = await CostTrackingRepository.get_today_tracking(db, day_start)
+        if tracking:
+            return tracking
         return {
-            "total_tokens": tracking.total_tokens,
-            "cache_read_tokens": tracking.cache_reads,  # Approximate - not exact token count
-            "requests": tracking.total_requests,
-            "total_cost_usd": tracking.total_cost_usd,
-            "cache_writes": tracking.cache_writes
+            "total_tokens": 0,
+            "cache_read_tokens": 0,
+            "requests": 0,
+            "total_cost_usd": 0.0,
+            "cache_writes": 0
         }
 
+    @staticmethod
+    async def get_today_tracking(
+        db: AsyncSession, day_start: Optional[datetime] = None
+    ) -> Optional[dict]:
+        """
+        Get today's complete cost tracking data.
+
+        This is the single query behind get_today_cost and get_today_requests.
+        Results are reused for TODAY_TRACKING_TTL_SECONDS, first from an
+        in-process copy and then from the shared Redis cache. update_daily_cost
+        writes fresh totals to both, so the budget check only reaches
+        Postgres when the cache is cold.
+
+        Args:
+            day_start: Start of the current UTC day if the caller already has
+                it (e.g. request.state.today_utc_start); computed otherwise
+        """
+        global _today_tracking_cache
+
+        today = day_start or today_utc_start()
+        now = time.monotonic()
+
+        if _today_tracking_cache is not None:
+            cached_day, fetched_at, cached_tracking = _today_tracking_cache
+            if cached_day == today and (now - fetched_at) < TODAY_TRACKING_TTL_SECONDS:
+                return cached_tracking
+
+        # Shared cache next; the row is wrapped so "no row yet" is cacheable too
+        cache_key = CostTrackingRepository._tracking_cache_key(today)
+        cached = await cache.get_json(cache_key)
+        if cached is not None:
+            data = cached["tracking"]
+        else:
+            result = await db.execute(_SELECT_TRACKING_BY_DATE, {"day": today})
+            tracking = result.one_or_none()
+
+            data = CostTrackingRepository._tracking_to_dict(tracking) if tracking else None
+
+            await cache.set_json(
+                cache_key, {"tracking": data}, int(TODAY_TRACKING_TTL_SECONDS)
+            )
+
+        _today_tracking_cache = (today, now, data)
+        return data
+
     @staticmethod
     async def get_recent_daily_costs(db: AsyncSession, days: int = 7) -> List[CostTracking]:
         """Get recent daily cost tracking records"""
@@ -1,44 +1,134 @@
 """
 Database Session Management
 """
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
 from sqlalchemy.pool import NullPool
 from app.config import settings
 from app.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
+# Connection pool configuration
+# SQLAlchemy picks AsyncAdaptedQueuePool for async engines, so no poolclass is
+# passed. NullPool is only used when an external pooler (pgbouncer in
+# transaction mode) already manages connections.
+if settings.db_use_null_pool:
+    pool_options = {"poolclass": NullPool}
+else:
+    pool_options = {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        # Pre-ping costs a SELECT 1 round-trip on every checkout. Stale
+        # connections are instead bounded by pool_recycle, which stays below
+        # typical server/proxy idle timeouts.
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "pool_recycle": 1800,  # Recycle connections every 30 minutes
+    }
+
+# asyncpg keeps a per-connection cache of prepared statements. Prepared
+# statements do not survive pgbouncer transaction pooling, so the cache is
+# turned off when an external pooler is in use.
+if settings.db_use_null_pool:
+    connect_args = {"prepared_statement_cache_size": 0, "statement_cache_size": 0}
+else:
+    connect_args = {"prepared_statement_cache_size": 256}
+
+# JIT only adds planning time for this app's small queries (and asyncpg's
+# type introspection on connect). application_name labels pg_stat_activity.
+connect_args["server_settings"] = {
+    "jit": "off",
+    "application_name": "portfolio-chatbot",
+}
+
 # Create async engine
 # Use async_database_url property which automatically converts Railway's DATABASE_URL
 # from postgresql:// to postgresql+asyncpg://
 engine = create_async_engine(
     settings.async_database_url,
-    echo=settings.debug,
-    poolclass=NullPool,  # Use NullPool for async to avoid connection pool issues
+    echo=settings.sql_echo,
     future=True,
+    connect_args=connect_args,
+    **pool_options,
 )
 
+
+class WriteTrackingSession(Session):
+    """
+    Session that records whether the current transaction wrote anything.
+
+    ORM flushes are visible through new/dirty/deleted, but Core-style
+    INSERT/UPDATE/DELETE statements (e.g. the repository upserts) are not,
+    so those are flagged in session.info as they execute.
+    """
+
+
+@event.listens_for(WriteTrackingSession, "do_orm_execute")
+def _flag_write_statements(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["has_writes"] = True
+
+
+@event.listens_for(WriteTrackingSession, "after_flush")
+def _flag_flush(session, flush_context):
+    session.info["has_writes"] = True
+
+
+@event.listens_for(WriteTrackingSession, "after_commit")
+@event.listens_for(WriteTrackingSession, "after_rollback")
+def _clear_write_flag(session):
+    session.info.pop("has_writes", None)
+
+
+def has_pending_writes(session: AsyncSession) -> bool:
+    """Check if a session has written (or will write on commit) in its transaction"""
+    return bool(
+        session.info.get("has_writes")
+        or session.new
+        or session.dirty
+        or session.deleted
+    )
+
+
 # Create async session factory
 AsyncSessionLocal = async_sessionmaker(
     engine,
     class_=AsyncSession,
+    sync_session_class=WriteTrackingSession,
     expire_on_commit=False,
     autocommit=False,
     autoflush=False,
 )
 
+# Read-only engine view sharing the same pool. AUTOCOMMIT skips the
+# BEGIN/COMMIT round-trips around every statement.
+ro_engine = engine.execution_options(isolation_level="AUTOCOMMIT")
+
+# Session factory for read-only request handlers
+AsyncReadOnlySessionLocal = async_sessionmaker(
+    ro_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+    autoflush=False,
+)
+
 
 async def get_db() -> AsyncSession:
     """
     Dependency function to get database session
 
+    Commits only if the request wrote something; read-only requests just
+    return the connection to the pool.
+
     Yields:
         AsyncSession: Database session
     """
     async with AsyncSessionLocal() as session:
         try:
             yield session
-            await session.commit()
+            if has_pending_writes(session):
+                await session.commit()
         except Exception as e:
             await session.rollback()
             logger.error(f"Database session error: {e}")
@@ -47,6 +137,20 @@ async def get_db() -> AsyncSession:
             await session.close()
 
 
+async def get_db_ro() -> AsyncSession:
+    """
+    Dependency function to get a read-only database session.
+
+    Statements run in autocommit mode and nothing is committed, so only use
+    this for handlers that never write.
+
+    Yields:
+        AsyncSession: Database session
+    """
+    async with AsyncReadOnlySessionLocal() as session:
+        yield session
+
+
 async def init_db():
     """Initialize database tables"""
     from app.models.db_models import Base
@@ -0,0 +1,79 @@
+"""
+Combined Middleware
+
+Security headers and cost control in a single pure ASGI layer:
+- Daily budget gate for POST /api/chat and /api/chat/stream
+- Security headers on every HTTP response
+- Fast path that sends liveness probes straight to the router
+"""
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.middleware.cost_control import CHAT_PATHS, check_budget
+from app.middleware.security import SECURITY_HEADERS
+from app.utils.dates import today_utc_start
+
+# Cheap, unauthenticated endpoints polled by platform health checks
+_FAST_PATHS = frozenset({"/health", "/"})
+# Other methods (405s, CORS preflight) take the normal path
+_FAST_METHODS = frozenset({"GET"})
+
+
+class CombinedMiddleware:
+    """
+    Middleware adding security headers and enforcing the daily budget.
+
+    Pure ASGI: one layer (and one send wrapper) per request, with headers
+    appended to the raw http.response.start message. Budget rejections get
+    the security headers as well.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message: Message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + SECURITY_HEADERS
+            await send(message)
+
+        # Only check cost controls for chat endpoints
+        if scope["path"] in CHAT_PATHS and scope["method"] == "POST":
+            # Computed once per request and shared with the route handler
+            day_start = today_utc_start()
+            scope.setdefault("state", {})["today_utc_start"] = day_start
+
+            rejection = await check_budget(day_start)
+            if rejection is not None:
+                await rejection(scope, receive, send_with_headers)
+                return
+
+        await self.app(scope, receive, send_with_headers)
+
+
+class FastPathMiddleware:
+    """
+    Outermost middleware that lets liveness probes skip the middleware stack.
+
+    GET /health and / are dispatched directly to fast_app (the router), so
+    frequent probes pay for no compression, CORS, security header, rate
+    limit or cost control work.
+    """
+
+    def __init__(self, app: ASGIApp, fast_app: ASGIApp):
+        self.app = app
+        self.fast_app = fast_app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if (
+            scope["type"] == "http"
+            and scope["path"] in _FAST_PATHS
+            and scope["method"] in _FAST_METHODS
+        ):
+            await self.fast_app(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
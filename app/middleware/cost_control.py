@@ -6,92 +6,98 @@ Implements budget controls to prevent runaway API costs:
 - Request count limits
 - Cost monitoring and alerts
 """
-from fastapi import Request, HTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
-from typing import Callable
-from datetime import datetime
+from fastapi.responses import ORJSONResponse
+from typing import Optional
 
 from app.config import settings
+from app.db.repository import CostTrackingRepository
+from app.db.session import AsyncReadOnlySessionLocal
 from app.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
 
-class CostControlMiddleware(BaseHTTPMiddleware):
-    """
-    Middleware to enforce daily cost budgets and request limits.
+# Endpoints that spend Claude API budget
+CHAT_PATHS = frozenset({"/api/chat", "/api/chat/stream"})
+
+# Daily budget limits (can be configured via environment variables)
+DAILY_COST_LIMIT_USD = float(settings.daily_cost_limit_usd)  # Default: $5.00
+DAILY_REQUEST_LIMIT = int(settings.daily_request_limit)  # Default: 1000
+
+# Warn when usage reaches 80% of either limit
+COST_WARNING_THRESHOLD = DAILY_COST_LIMIT_USD * 0.8
+REQUEST_WARNING_THRESHOLD = DAILY_REQUEST_LIMIT * 0.8
 
-    This middleware checks if the daily budget has been exceeded before
-    processing chat requests that would incur LLM API costs.
+
+async def check_budget(day_start) -> Optional[ORJSONResponse]:
     """
+    Check today's usage against the daily limits.
+
+    Run by CombinedMiddleware before POST requests to CHAT_PATHS.
 
-    # Daily budget limits (can be configured via environment variables)
-    DAILY_COST_LIMIT_USD = float(settings.daily_cost_limit_usd)  # Default: $5.00
-    DAILY_REQUEST_LIMIT = int(settings.daily_request_limit)  # Default: 1000
-
-    async def dispatch(self, request: Request, call_next: Callable):
-        # Only check cost controls for chat endpoints
-        if request.url.path == "/api/chat" and request.method == "POST":
-            try:
-                # Get database session from request state
-                # Note: This requires the request to have gone through the database middleware
-                from app.db.session import async_session_maker
-                from app.db.repository import CostTrackingRepository
-
-                async with async_session_maker() as db:
-                    # Get today's costs
-                    today_cost = await CostTrackingRepository.get_today_cost(db)
-                    today_requests = await CostTrackingRepository.get_today_requests(db)
-
-                    # Check if daily cost limit exceeded
-                    if today_cost >= self.DAILY_COST_LIMIT_USD:
-                        logger.error(
-                            f"Daily cost limit exceeded: ${today_cost:.2f} >= "
-                            f"${self.DAILY_COST_LIMIT_USD:.2f}"
-                        )
-                        raise HTTPException(
-                            status_code=429,
-                            detail=f"Daily cost budget of ${self.DAILY_COST_LIMIT_USD:.2f} "
-                            f"has been reached. Please try again tomorrow."
-                        )
-
-                    # Check if daily request limit exceeded
-                    if today_requests >= self.DAILY_REQUEST_LIMIT:
-                        logger.error(
-                            f"Daily request limit exceeded: {today_requests} >= "
-                            f"{self.DAILY_REQUEST_LIMIT}"
-                        )
-                        raise HTTPException(
-                            status_code=429,
-                            detail=f"Daily request limit of {self.DAILY_REQUEST_LIMIT} "
-                            f"has been reached. Please try again tomorrow."
-                        )
-
-                    # Log warning if approaching limits (80% threshold)
-                    cost_threshold = self.DAILY_COST_LIMIT_USD * 0.8
-                    request_threshold = self.DAILY_REQUEST_LIMIT * 0.8
-
-                    if today_cost >= cost_threshold:
-                        logger.warning(
-                            f"Approaching daily cost limit: ${today_cost:.4f} "
-                            f"(${self.DAILY_COST_LIMIT_USD:.2f} limit)"
-                        )
-
-                    if today_requests >= request_threshold:
-                        logger.warning(
-                            f"Approaching daily request limit: {today_requests} "
-                            f"({self.DAILY_REQUEST_LIMIT} limit)"
-                        )
-
-            except HTTPException:
-                raise
-            except Exception as e:
-                logger.error(f"Error checking cost controls: {e}")
-                # Continue processing if cost check fails (fail open)
-                # In production, you might want to fail closed for safety
-
-        response = await call_next(request)
-        return response
+    Args:
+        day_start: Start of the current UTC day
+
+    Returns:
+        A 429 response if a limit is exceeded, otherwise None
+    """
+    try:
+        # Read-only session: today's totals are usually served from the
+        # cost cache, and a pooled connection is only checked out on a miss
+        async with AsyncReadOnlySessionLocal() as db:
+            # Get today's costs
+            summary = await CostTrackingRepository.get_today_summary(db, day_start)
+            today_cost = summary["total_cost_usd"]
+            today_requests = summary["requests"]
+
+    except Exception as e:
+        logger.error(f"Error checking cost controls: {e}")
+        # Continue processing if cost check fails (fail open)
+        # In production, you might want to fail closed for safety
+        return None
+
+    # Check if daily cost limit exceeded
+    if today_cost >= DAILY_COST_LIMIT_USD:
+        logger.error(
+            f"Daily cost limit exceeded: ${today_cost:.2f} >= "
+            f"${DAILY_COST_LIMIT_USD:.2f}"
+        )
+        return ORJSONResponse(
+            status_code=429,
+            content={
+                "detail": f"Daily cost budget of ${DAILY_COST_LIMIT_USD:.2f} "
+                f"has been reached. Please try again tomorrow."
+            }
+        )
+
+    # Check if daily request limit exceeded
+    if today_requests >= DAILY_REQUEST_LIMIT:
+        logger.error(
+            f"Daily request limit exceeded: {today_requests} >= "
+            f"{DAILY_REQUEST_LIMIT}"
+        )
+        return ORJSONResponse(
+            status_code=429,
+            content={
+                "detail": f"Daily request limit of {DAILY_REQUEST_LIMIT} "
+                f"has been reached. Please try again tomorrow."
+            }
+        )
+
+    # Log warning if approaching limits (80% threshold)
+    if today_cost >= COST_WARNING_THRESHOLD:
+        logger.warning(
+            f"Approaching daily cost limit: ${today_cost:.4f} "
+            f"(${DAILY_COST_LIMIT_USD:.2f} limit)"
+        )
+
+    if today_requests >= REQUEST_WARNING_THRESHOLD:
+        logger.warning(
+            f"Approaching daily request limit: {today_requests} "
+            f"({DAILY_REQUEST_LIMIT} limit)"
+        )
+
+    return None
 
 
 async def check_cost_budget(db) -> dict:
@@ -104,13 +110,12 @@ async def check_cost_budget(db) -> dict:
     Returns:
         Dictionary with budget status information
     """
-    from app.db.repository import CostTrackingRepository
-
-    today_cost = await CostTrackingRepository.get_today_cost(db)
-    today_requests = await CostTrackingRepository.get_today_requests(db)
+    summary = await CostTrackingRepository.get_today_summary(db)
+    today_cost = summary["total_cost_usd"]
+    today_requests = summary["requests"]
 
-    daily_cost_limit = float(settings.daily_cost_limit_usd)
-    daily_request_limit = int(settings.daily_request_limit)
+    daily_cost_limit = DAILY_COST_LIMIT_USD
+    daily_request_limit = DAILY_REQUEST_LIMIT
 
     return {
         "today_cost_usd": today_cost,
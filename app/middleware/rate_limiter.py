@@ -9,11 +9,9 @@ Implements rate limiting to prevent API abuse:
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
-from typing import Callable
-import time
+from fastapi import Request
 
+from app.config import settings
 from app.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
@@ -39,31 +37,16 @@ def get_client_identifier(request: Request) -> str:
 
 # Initialize rate limiter with Redis backend (or in-memory fallback)
 # Format: "number/time_unit" (e.g., "10/minute", "100/hour")
+# Redis storage makes the limits global across uvicorn workers
 limiter = Limiter(
     key_func=get_client_identifier,
     default_limits=["60/minute", "1000/hour"],  # Global limits
-    storage_uri="memory://",  # Use in-memory storage (can switch to Redis)
+    storage_uri=settings.redis_url,
+    in_memory_fallback_enabled=True,  # Per-process limits while Redis is down
     headers_enabled=True,  # Include rate limit info in response headers
 )
 
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    """
-    Middleware to log rate limit events and add custom headers
-    """
-
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        try:
-            response = await call_next(request)
-            return response
-        except RateLimitExceeded as e:
-            logger.warning(
-                f"Rate limit exceeded for {get_remote_address(request)} "
-                f"on {request.url.path}"
-            )
-            raise
-
-
 def get_rate_limiter():
     """Get the rate limiter instance"""
     return limiter
@@ -12,41 +12,56 @@ from fastapi import Request, Response, HTTPException
 from starlette.middleware.base import BaseHTTPMiddleware
 from typing import Callable
 import re
-import html
 
 from app.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
 
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
-    """
-    Middleware to add security headers to all responses
-    """
-
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        response = await call_next(request)
-
-        # Add security headers
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-
-        # Content Security Policy - restrictive for API
-        response.headers["Content-Security-Policy"] = (
-            "default-src 'none'; "
-            "frame-ancestors 'none'; "
-            "base-uri 'none';"
-        )
-
-        # HSTS - only enable in production with HTTPS
-        # Uncomment when deploying with HTTPS
-        # response.headers["Strict-Transport-Security"] = (
-        #     "max-age=31536000; includeSubDomains"
-        # )
-
-        return response
+# Security headers appended to every HTTP response by CombinedMiddleware,
+# pre-encoded once
+SECURITY_HEADERS = [
+    (b"x-content-type-options", b"nosniff"),
+    (b"x-frame-options", b"DENY"),
+    (b"x-xss-protection", b"1; mode=block"),
+    (b"referrer-policy", b"strict-origin-when-cross-origin"),
+    # Content Security Policy - restrictive for API
+    (
+        b"content-security-policy",
+        b"default-src 'none'; frame-ancestors 'none'; base-uri 'none';",
+    ),
+    # HSTS - only enable in production with HTTPS
+    # Uncomment when deploying with HTTPS
+    # (b"strict-transport-security", b"max-age=31536000; includeSubDomains"),
+]
+
+
+# Patterns to detect potential injection attacks
+SUSPICIOUS_PATTERNS = [
+    r"<script[^>]*>.*?</script>",  # XSS
+    r"javascript:",  # JavaScript protocol
+    r"on\w+\s*=",  # Event handlers
+    r"(union|select|insert|update|delete|drop|create|alter|exec|execute)\s",  # SQL injection attempts
+]
+
+# All patterns fused into one alternation so the body is scanned once;
+# group p<i> tells which entry of SUSPICIOUS_PATTERNS matched. Compiled as a
+# bytes pattern so the raw body is searched without decoding it first.
+_SUSPICIOUS_RE = re.compile(
+    "|".join(f"(?P<p{i}>{pattern})" for i, pattern in enumerate(SUSPICIOUS_PATTERNS)).encode(),
+    re.IGNORECASE | re.DOTALL,
+)
+
+# Only endpoints that accept free-form user text are scanned
+VALIDATED_PATHS = frozenset({"/api/chat", "/api/chat/stream"})
+
+# Equivalent to html.escape(quote=False)
+_ESCAPE_TABLE = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;"})
+
+_UUID_RE = re.compile(
+    r'^[0-9a-f]{8}-[0-9a-f]{4}-4[0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12}$',
+    re.IGNORECASE
+)
 
 
 class InputValidationMiddleware(BaseHTTPMiddleware):
@@ -54,34 +69,31 @@ class InputValidationMiddleware(BaseHTTPMiddleware):
     Middleware to validate and sanitize inputs
     """
 
-    # Patterns to detect potential injection attacks
-    SUSPICIOUS_PATTERNS = [
-        r"<script[^>]*>.*?</script>",  # XSS
-        r"javascript:",  # JavaScript protocol
-        r"on\w+\s*=",  # Event handlers
-        r"(?i)(union|select|insert|update|delete|drop|create|alter|exec|execute)\s",  # SQL injection attempts
-    ]
+    SUSPICIOUS_PATTERNS = SUSPICIOUS_PATTERNS
 
     async def dispatch(self, request: Request, call_next: Callable) -> Response:
         # Only validate POST requests with JSON body
-        if request.method == "POST" and "application/json" in request.headers.get("content-type", "").lower():
+        if (
+            request.method == "POST"
+            and request.url.path in VALIDATED_PATHS
+            and "application/json" in request.headers.get("content-type", "").lower()
+        ):
             try:
                 # Get request body
                 body = await request.body()
 
                 if body:
-                    body_str = body.decode("utf-8")
-
                     # Check for suspicious patterns (basic detection)
-                    for pattern in self.SUSPICIOUS_PATTERNS:
-                        if re.search(pattern, body_str, re.IGNORECASE):
-                            logger.warning(
-                                f"Suspicious pattern detected in request from "
-                                f"{request.client.host if request.client else 'unknown'}: "
-                                f"Pattern: {pattern}"
-                            )
-                            # In a real-world scenario, you might want to block this
-                            # For now, we just log it
+                    match = _SUSPICIOUS_RE.search(body)
+                    if match:
+                        pattern = SUSPICIOUS_PATTERNS[int(match.lastgroup[1:])]
+                        logger.warning(
+                            f"Suspicious pattern detected in request from "
+                            f"{request.client.host if request.client else 'unknown'}: "
+                            f"Pattern: {pattern}"
+                        )
+                        # In a real-world scenario, you might want to block this
+                        # For now, we just log it
 
                     # Reconstruct request with original body
                     # This is necessary because we consumed the body
@@ -130,7 +142,9 @@ def sanitize_input(text: str, max_length: int = 1000) -> str:
 
     # HTML escape to prevent XSS (just in case)
     # Note: This is defensive - the frontend should handle rendering safely
-    text = html.escape(text, quote=False)
+    # Same output as html.escape(text, quote=False); most messages need no escaping
+    if "&" in text or "<" in text or ">" in text:
+        text = text.translate(_ESCAPE_TABLE)
 
     return text
 
@@ -145,8 +159,14 @@ def validate_session_id(session_id: str) -> bool:
     Returns:
         True if valid UUID format
     """
-    uuid_pattern = re.compile(
-        r'^[0-9a-f]{8}-[0-9a-f]{4}-4[0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12}$',
-        re.IGNORECASE
-    )
-    return bool(uuid_pattern.match(session_id))
+    # Cheap shape check first: a UUID is 36 chars with hyphens at fixed offsets
+    if (
+        not session_id
+        or len(session_id) != 36
+        or session_id[8] != "-"
+        or session_id[13] != "-"
+        or session_id[18] != "-"
+        or session_id[23] != "-"
+    ):
+        return False
+    return bool(_UUID_RE.match(session_id))
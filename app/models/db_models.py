@@ -1,10 +1,9 @@
 """
 SQLAlchemy Database Models
 """
-from sqlalchemy import Column, String, Integer, Float, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, String, Integer, Float, Text, DateTime, ForeignKey, Boolean, Index, func, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
-from datetime import datetime
 
 Base = declarative_base()
 
@@ -14,14 +13,27 @@ class Session(Base):
     __tablename__ = "sessions"
 
     id = Column(String(100), primary_key=True)
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
     ip_address = Column(String(45), nullable=True)
     user_agent = Column(String(500), nullable=True)
     is_active = Column(Boolean, default=True, nullable=False)
 
     # Relationships
-    messages = relationship("Message", back_populates="session", cascade="all, delete-orphan")
+    # lazy="raise": load explicitly with selectinload(Session.messages) to avoid N+1 queries.
+    # passive_deletes lets the ON DELETE CASCADE foreign key remove messages.
+    messages = relationship(
+        "Message",
+        back_populates="session",
+        cascade="all, delete-orphan",
+        lazy="raise",
+        passive_deletes=True,
+    )
+
+    __table_args__ = (
+        # Per-IP lookups over active sessions only
+        Index("ix_sessions_active_ip", "ip_address", postgresql_where=text("is_active")),
+    )
 
     def __repr__(self):
         return f"<Session(id={self.id}, created_at={self.created_at})>"
@@ -38,11 +50,16 @@ class Message(Base):
     intent = Column(String(100), nullable=True)
     tokens_used = Column(Integer, nullable=True)
     cost_usd = Column(Float, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
     # Relationships
     session = relationship("Session", back_populates="messages")
 
+    __table_args__ = (
+        # Recent-history lookups: WHERE session_id = ? ORDER BY created_at DESC
+        Index("ix_messages_session_created", "session_id", created_at.desc()),
+    )
+
     def __repr__(self):
         return f"<Message(id={self.id}, session_id={self.session_id}, role={self.role})>"
 
@@ -56,7 +73,12 @@ class Feedback(Base):
     message_id = Column(Integer, ForeignKey("messages.id", ondelete="CASCADE"), nullable=True)
     rating = Column(Integer, nullable=True)  # 1-5 stars, or thumbs up/down (1/0)
     comment = Column(Text, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        # Foreign keys are not indexed automatically in PostgreSQL
+        Index("ix_feedback_session_id", "session_id"),
+    )
 
     def __repr__(self):
         return f"<Feedback(id={self.id}, session_id={self.session_id}, rating={self.rating})>"
@@ -73,8 +95,8 @@ class CostTracking(Base):
     total_cost_usd = Column(Float, default=0.0, nullable=False)
     cache_reads = Column(Integer, default=0, nullable=False)
     cache_writes = Column(Integer, default=0, nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
 
     def __repr__(self):
         return f"<CostTracking(date={self.date}, total_cost_usd={self.total_cost_usd})>"
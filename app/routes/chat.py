@@ -1,26 +1,32 @@
 """
 Chat API Routes
 
-Main chatbot endpoint that orchestrates all services:
+Main chatbot endpoints (JSON and streaming) that orchestrate all services:
 - Intent classification
 - Context loading
 - Conversation history management
 - LLM response generation
 """
-from fastapi import APIRouter, HTTPException, Request, Depends
-from typing import Optional
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Request, Depends
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Tuple
+import asyncio
 import uuid
-from datetime import datetime, date
+import orjson
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import settings
 from app.models.schemas import ChatRequest, ChatResponse, MessageCreate
 from app.services.intent_classifier import intent_classifier
 from app.services.context_loader import context_loader
 from app.services.conversation_manager import conversation_manager
 from app.services.llm_service import llm_service
-from app.db.session import get_db
+from app.db.session import AsyncSessionLocal, get_db, get_db_ro
 from app.db.repository import SessionRepository, MessageRepository, CostTrackingRepository
 from app.utils.logger import setup_logger
+from app.utils.dates import today_utc_start
 from app.middleware.rate_limiter import limiter
 from app.middleware.security import sanitize_input, validate_session_id
 from app.middleware.cost_control import check_cost_budget
@@ -30,15 +36,197 @@ logger = setup_logger(__name__)
 router = APIRouter(prefix="/api", tags=["chat"])
 
 
+def _save_turn_to_history(
+    session_id: str,
+    user_message: str,
+    response_text: str,
+    user_metadata: dict,
+    assistant_metadata: dict,
+):
+    """Append a user/assistant exchange to the conversation history (blocking Redis calls)"""
+    conversation_manager.add_message(
+        session_id=session_id,
+        role="user",
+        content=user_message,
+        metadata=user_metadata
+    )
+    conversation_manager.add_message(
+        session_id=session_id,
+        role="assistant",
+        content=response_text,
+        metadata=assistant_metadata
+    )
+
+
+async def _persist_turn(
+    session_id: str,
+    user_message: str,
+    response_text: str,
+    intents: List[str],
+    primary_intent: str,
+    usage_stats: dict,
+    day_start: Optional[datetime] = None,
+):
+    """
+    Persist a chat exchange in its own database session.
+
+    Runs as a background task after the response has been sent, so it must
+    not use the request-scoped session.
+
+    Args:
+        day_start: UTC day to charge the usage to; None skips cost tracking
+            (e.g. canned greetings)
+    """
+    total_tokens = usage_stats.get("total_tokens", 0)
+    cost_usd = usage_stats.get("cost_usd", 0.0)
+
+    try:
+        async with AsyncSessionLocal() as db:
+            # Both messages in one INSERT
+            await MessageRepository.create_messages_bulk(
+                db=db,
+                rows=[
+                    MessageCreate(
+                        session_id=session_id,
+                        role="user",
+                        content=user_message,
+                        intent=",".join(intents),
+                        tokens_used=usage_stats.get("input_tokens", 0),
+                        cost_usd=0.0  # Cost is on assistant message
+                    ),
+                    MessageCreate(
+                        session_id=session_id,
+                        role="assistant",
+                        content=response_text,
+                        intent=primary_intent,
+                        tokens_used=total_tokens,
+                        cost_usd=cost_usd
+                    ),
+                ]
+            )
+
+            # Update daily cost tracking
+            if day_start is not None:
+                cache_hit = usage_stats.get("cache_read_tokens", 0) > 0
+                await CostTrackingRepository.update_daily_cost(
+                    db=db,
+                    day_start=day_start,
+                    tokens=total_tokens,
+                    cost=cost_usd,
+                    is_cache_read=cache_hit
+                )
+
+            await db.commit()
+    except Exception as e:
+        logger.error("Failed to persist chat turn for session %s: %s", session_id, e, exc_info=True)
+
+
+async def _record_billed_usage(usage_stats: dict, day_start: datetime):
+    """
+    Charge usage that produced no stored reply to the daily cost.
+
+    Tokens and cost are added without counting a request, since the visitor
+    got no answer.
+    """
+    try:
+        async with AsyncSessionLocal() as db:
+            await CostTrackingRepository.update_daily_cost(
+                db=db,
+                day_start=day_start,
+                tokens=usage_stats.get("total_tokens", 0),
+                cost=usage_stats.get("cost_usd", 0.0),
+                count_request=False
+            )
+            await db.commit()
+    except Exception as e:
+        logger.error("Failed to record billed usage: %s", e, exc_info=True)
+
+
+async def _prepare_turn(
+    http_request: Request,
+    request: ChatRequest,
+    db: AsyncSession,
+) -> Tuple[str, str, List[str], str, List[dict]]:
+    """
+    Validate the request and gather what both chat endpoints need.
+
+    Returns:
+        (session_id, user_message, intents, primary_intent, conversation_history)
+    """
+    # Generate session ID if not provided
+    session_id = request.session_id or str(uuid.uuid4())
+
+    # Validate session ID format if provided
+    if request.session_id and not validate_session_id(request.session_id):
+        raise HTTPException(status_code=400, detail="Invalid session ID format")
+
+    # Sanitize and validate user message
+    user_message = sanitize_input(request.message, max_length=1000)
+
+    logger.info("Processing chat request for session: %s", session_id)
+
+    # Create or get session in database
+    client_ip = http_request.client.host if http_request.client else None
+    user_agent = http_request.headers.get("user-agent", "")
+
+    # Classify intent, while the session upsert (Postgres) and
+    # the history read (Redis) run alongside it. The classifier may call
+    # the blocking Anthropic client, so it and the sync Redis client run
+    # in worker threads off the event loop.
+    _, intents, conversation_history = await asyncio.gather(
+        SessionRepository.get_or_create_session(
+            db=db,
+            session_id=session_id,
+            ip_address=client_ip,
+            user_agent=user_agent
+        ),
+        asyncio.to_thread(intent_classifier.classify, user_message),
+        asyncio.to_thread(
+            conversation_manager.format_history_for_llm,
+            session_id=session_id,
+            limit=10,  # Last 10 messages
+            max_tokens=settings.history_token_budget
+        ),
+    )
+    logger.info("Using session: %s", session_id)
+    primary_intent = intents[0] if intents else "general"
+
+    logger.info("Classified intents: %s, primary: %s", intents, primary_intent)
+
+    return session_id, user_message, intents, primary_intent, conversation_history
+
+
+def _load_portfolio_context(intents: List[str]) -> Optional[str]:
+    """Load portfolio context for the intents; None for casual conversation"""
+    # For "normal" casual conversations, this will return empty string
+    portfolio_context = context_loader.get_context_for_intents(
+        intents=intents,
+        use_cache=True,
+        include_headers=True
+    )
+
+    # If context is empty (e.g., for "normal" intent), pass None to LLM
+    if not portfolio_context or portfolio_context.strip() == "":
+        logger.info("No context loaded (casual conversation mode)")
+        return None
+    # Context size is already logged by context_loader
+    return portfolio_context
+
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat(
     http_request: Request,
     request: ChatRequest,
+    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db)
-) -> ChatResponse:
+) -> ORJSONResponse:
     """
     Process a chat message and return AI response.
 
+    The body matches ChatResponse (kept as response_model for the OpenAPI
+    schema) but is built as a plain dict and encoded by orjson directly,
+    skipping response-model validation on this hot path.
+
     Orchestrates the complete chatbot flow:
     1. Classify user message intent
     2. Load relevant portfolio context
@@ -55,203 +243,263 @@ async def chat(
         ChatResponse with AI response and metadata
     """
     try:
-        # Generate session ID if not provided
-        session_id = request.session_id or str(uuid.uuid4())
-
-        # Validate session ID format if provided
-        if request.session_id and not validate_session_id(request.session_id):
-            raise HTTPException(status_code=400, detail="Invalid session ID format")
-
-        # Sanitize and validate user message
-        user_message = sanitize_input(request.message, max_length=1000)
-
-        logger.info(f"Processing chat request for session: {session_id}")
-
-        # Create or get session in database
-        client_ip = http_request.client.host if http_request.client else None
-        user_agent = http_request.headers.get("user-agent", "")
-
-        db_session = await SessionRepository.get_or_create_session(
-            db=db,
-            session_id=session_id,
-            ip_address=client_ip,
-            user_agent=user_agent
-        )
-        logger.info(f"Using session: {session_id}")
-
-        # Step 1: Classify intent
-        intents = intent_classifier.classify(user_message)
-        primary_intent = intents[0] if intents else "general"
-
-        logger.info(f"Classified intents: {intents}, primary: {primary_intent}")
+        # Step 1: Validate, classify intent and fetch history
+        (
+            session_id, user_message, intents, primary_intent, conversation_history
+        ) = await _prepare_turn(http_request, request, db)
 
         # Step 2: Handle greetings separately (no LLM call needed)
         if primary_intent == "greeting":
             response_text, usage_stats = llm_service.generate_greeting_response()
 
             # Save to conversation history (Redis)
-            conversation_manager.add_message(
-                session_id=session_id,
-                role="user",
-                content=user_message,
-                metadata={"intent": intents}
-            )
-            conversation_manager.add_message(
-                session_id=session_id,
-                role="assistant",
-                content=response_text,
-                metadata={"intent": intents, "cost_usd": 0.0}
+            await asyncio.to_thread(
+                _save_turn_to_history,
+                session_id,
+                user_message,
+                response_text,
+                {"intent": intents},
+                {"intent": intents, "cost_usd": 0.0},
             )
 
-            # Save to database (PostgreSQL)
-            await MessageRepository.create_message(
-                db=db,
-                message_data=MessageCreate(
-                    session_id=session_id,
-                    role="user",
-                    content=user_message,
-                    intent=",".join(intents),
-                    tokens_used=0,
-                    cost_usd=0.0
-                )
-            )
-            await MessageRepository.create_message(
-                db=db,
-                message_data=MessageCreate(
-                    session_id=session_id,
-                    role="assistant",
-                    content=response_text,
-                    intent=primary_intent,
-                    tokens_used=0,
-                    cost_usd=0.0
-                )
-            )
-            await db.commit()
-
-            return ChatResponse(
+            # Save to database (PostgreSQL) after the response is sent
+            background_tasks.add_task(
+                _persist_turn,
                 session_id=session_id,
-                message=response_text,
-                intent=primary_intent,
-                tokens_used=0,
-                cost_usd=0.0,
-                cached=False
+                user_message=user_message,
+                response_text=response_text,
+                intents=intents,
+                primary_intent=primary_intent,
+                usage_stats=usage_stats,
             )
 
-        # Step 3: Load portfolio context based on intents
-        # For "normal" casual conversations, this will return empty string
-        portfolio_context = context_loader.get_context_for_intents(
-            intents=intents,
-            use_cache=True,
-            include_headers=True
-        )
-
-        # If context is empty (e.g., for "normal" intent), pass None to LLM
-        if not portfolio_context or portfolio_context.strip() == "":
-            portfolio_context = None
-            logger.info("No context loaded (casual conversation mode)")
-        else:
-            logger.info(f"Loaded context: {len(portfolio_context)} characters")
+            return ORJSONResponse({
+                "session_id": session_id,
+                "message": response_text,
+                "intent": primary_intent,
+                "tokens_used": 0,
+                "cost_usd": 0.0,
+                "cached": False
+            })
 
-        # Step 4: Get conversation history
-        conversation_history = conversation_manager.format_history_for_llm(
-            session_id=session_id,
-            limit=10  # Last 10 messages
-        )
+        # Step 3: Load portfolio context based on intents
+        portfolio_context = _load_portfolio_context(intents)
 
-        logger.info(f"Retrieved {len(conversation_history)} messages from history")
+        # Step 4: Conversation history was fetched alongside classification
+        logger.info("Retrieved %d messages from history", len(conversation_history))
 
         # Step 5: Generate AI response
-        response_text, usage_stats = llm_service.generate_response(
+        response_text, usage_stats = await llm_service.generate_response(
             user_message=user_message,
             portfolio_context=portfolio_context,
             conversation_history=conversation_history,
             use_cache=True
         )
 
-        logger.info(
-            f"Generated response: {usage_stats['total_tokens']} tokens, "
-            f"${usage_stats['cost_usd']:.6f}"
-        )
+        # Read the usage counters once
+        input_tokens = usage_stats.get("input_tokens", 0)
+        output_tokens = usage_stats.get("output_tokens", 0)
+        total_tokens = usage_stats.get("total_tokens", 0)
+        cost_usd = usage_stats.get("cost_usd", 0.0)
+        cached = usage_stats.get("cache_read_tokens", 0) > 0
 
-        # Step 6: Save to conversation history (Redis)
-        conversation_manager.add_message(
-            session_id=session_id,
-            role="user",
-            content=user_message,
-            metadata={
+        logger.info("Generated response: %d tokens, $%.6f", total_tokens, cost_usd)
+
+        # Step 6: Save to conversation history (Redis); the next turn reads it
+        await asyncio.to_thread(
+            _save_turn_to_history,
+            session_id,
+            user_message,
+            response_text,
+            {
+                "intent": intents,
+                "tokens": input_tokens
+            },
+            {
                 "intent": intents,
-                "tokens": usage_stats.get("input_tokens", 0)
-            }
+                "tokens": output_tokens,
+                "cost_usd": cost_usd
+            },
         )
 
-        conversation_manager.add_message(
+        # Save to database (PostgreSQL) and update daily cost tracking after
+        # the response is sent
+        background_tasks.add_task(
+            _persist_turn,
             session_id=session_id,
-            role="assistant",
-            content=response_text,
-            metadata={
-                "intent": intents,
-                "tokens": usage_stats.get("output_tokens", 0),
-                "cost_usd": usage_stats.get("cost_usd", 0.0)
-            }
+            user_message=user_message,
+            response_text=response_text,
+            intents=intents,
+            primary_intent=primary_intent,
+            usage_stats=usage_stats,
+            day_start=getattr(http_request.state, "today_utc_start", None) or today_utc_start(),
         )
 
-        # Save to database (PostgreSQL)
-        await MessageRepository.create_message(
-            db=db,
-            message_data=MessageCreate(
-                session_id=session_id,
-                role="user",
-                content=user_message,
-                intent=",".join(intents),
-                tokens_used=usage_stats.get("input_tokens", 0),
-                cost_usd=0.0  # Cost is on assistant message
-            )
-        )
-        await MessageRepository.create_message(
-            db=db,
-            message_data=MessageCreate(
-                session_id=session_id,
-                role="assistant",
-                content=response_text,
-                intent=primary_intent,
-                tokens_used=usage_stats.get("total_tokens", 0),
-                cost_usd=usage_stats.get("cost_usd", 0.0)
-            )
-        )
+        # Step 7: Return response
+        return ORJSONResponse({
+            "session_id": session_id,
+            "message": response_text,
+            "intent": primary_intent,
+            "tokens_used": total_tokens,
+            "cost_usd": cost_usd,
+            "cached": cached
+        })
 
-        # Update daily cost tracking
-        cache_hit = usage_stats.get("cache_read_tokens", 0) > 0
-        await CostTrackingRepository.update_daily_cost(
-            db=db,
-            date=datetime.now(),
-            tokens=usage_stats.get("total_tokens", 0),
-            cost=usage_stats.get("cost_usd", 0.0),
-            is_cache_read=cache_hit
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error processing chat request: %s", e, exc_info=True)
+        raise HTTPException(
+            status_code=500,
+            detail="An error occurred while processing your message. Please try again."
         )
-        await db.commit()
 
-        # Determine if cache was used
-        cached = usage_stats.get("cache_read_tokens", 0) > 0
 
-        # Step 7: Return response
-        return ChatResponse(
-            session_id=session_id,
-            message=response_text,
-            intent=primary_intent,
-            tokens_used=usage_stats.get("total_tokens", 0),
-            cost_usd=usage_stats.get("cost_usd", 0.0),
-            cached=cached
-        )
+def _sse(data: dict, event: Optional[str] = None) -> bytes:
+    """Encode one server-sent event"""
+    prefix = f"event: {event}\n".encode() if event else b""
+    return prefix + b"data: " + orjson.dumps(data) + b"\n\n"
 
+
+@router.post("/chat/stream")
+async def chat_stream(
+    http_request: Request,
+    request: ChatRequest,
+    db: AsyncSession = Depends(get_db)
+) -> StreamingResponse:
+    """
+    Process a chat message and stream the AI response as server-sent events.
+
+    Same flow as /api/chat, but text is forwarded as Claude generates it so
+    the first words reach the visitor without waiting for the full reply.
+
+    Events:
+        data: {"delta": "..."} for each chunk of response text
+        event: done with session_id, intent, tokens_used, cost_usd, cached
+        event: error if generation fails after the stream has started
+    """
+    try:
+        session_id, user_message, intents, primary_intent, conversation_history = (
+            await _prepare_turn(http_request, request, db)
+        )
+        portfolio_context = (
+            None if primary_intent == "greeting" else _load_portfolio_context(intents)
+        )
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error processing chat request: {e}", exc_info=True)
+        logger.error("Error processing chat request: %s", e, exc_info=True)
         raise HTTPException(
             status_code=500,
             detail="An error occurred while processing your message. Please try again."
         )
 
+    day_start = getattr(http_request.state, "today_utc_start", None) or today_utc_start()
+
+    # Filled in as the stream runs and recorded by a background task, which
+    # Starlette runs even when the client disconnects mid-stream
+    chunks: List[str] = []
+    usage_stats: dict = {}
+    state = {"completed": False}
+
+    async def events() -> AsyncIterator[bytes]:
+        # Greetings need no LLM call; send the canned reply as one chunk
+        if primary_intent == "greeting":
+            response_text, greeting_usage = llm_service.generate_greeting_response()
+            usage_stats.update(greeting_usage)
+            chunks.append(response_text)
+            yield _sse({"delta": response_text})
+        else:
+            try:
+                async for text in llm_service.stream_response(
+                    user_message=user_message,
+                    portfolio_context=portfolio_context,
+                    conversation_history=conversation_history,
+                    use_cache=True,
+                    usage_stats=usage_stats
+                ):
+                    chunks.append(text)
+                    yield _sse({"delta": text})
+            except Exception as e:
+                logger.error("Error streaming chat response: %s", e, exc_info=True)
+                yield _sse(
+                    {"detail": "An error occurred while processing your message. Please try again."},
+                    event="error"
+                )
+                return
+
+        state["completed"] = True
+        yield _sse(
+            {
+                "session_id": session_id,
+                "intent": primary_intent,
+                "tokens_used": usage_stats.get("total_tokens", 0),
+                "cost_usd": usage_stats.get("cost_usd", 0.0),
+                "cached": usage_stats.get("cache_read_tokens", 0) > 0
+            },
+            event="done"
+        )
+
+    async def record_turn():
+        """Record the exchange, including usage billed by an interrupted stream."""
+        response_text = "".join(chunks)
+        cost_usd = usage_stats.get("cost_usd", 0.0)
+
+        if not state["completed"] and not chunks:
+            # Failed before any text: there is no reply to store, but input
+            # may already have been billed
+            if usage_stats.get("total_tokens"):
+                await _record_billed_usage(usage_stats, day_start)
+            return
+
+        if state["completed"]:
+            # Only full replies go into the history sent back to the LLM
+            try:
+                await asyncio.to_thread(
+                    _save_turn_to_history,
+                    session_id,
+                    user_message,
+                    response_text,
+                    {
+                        "intent": intents,
+                        "tokens": usage_stats.get("input_tokens", 0)
+                    },
+                    {
+                        "intent": intents,
+                        "tokens": usage_stats.get("output_tokens", 0),
+                        "cost_usd": cost_usd
+                    },
+                )
+            except Exception as e:
+                logger.error("Failed to save history for session %s: %s", session_id, e)
+        else:
+            logger.warning(
+                "Stream for session %s ended early (%d tokens, $%.6f billed)",
+                session_id, usage_stats.get("total_tokens", 0), cost_usd
+            )
+
+        await _persist_turn(
+            session_id=session_id,
+            user_message=user_message,
+            response_text=response_text,
+            intents=intents,
+            primary_intent=primary_intent,
+            usage_stats=usage_stats,
+            day_start=None if primary_intent == "greeting" else day_start,
+        )
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        background=BackgroundTask(record_turn),
+        # identity keeps GZipMiddleware from buffering the deltas
+        headers={
+            "Cache-Control": "no-cache",
+            "Content-Encoding": "identity",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
 
 @router.get("/session/{session_id}/history")
 async def get_session_history(session_id: str):
@@ -280,7 +528,7 @@ async def get_session_history(session_id: str):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error retrieving session history: {e}")
+        logger.error("Error retrieving session history: %s", e)
         raise HTTPException(status_code=500, detail="Failed to retrieve session history")
 
 
@@ -309,7 +557,7 @@ async def clear_session(session_id: str):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error clearing session: {e}")
+        logger.error("Error clearing session: %s", e)
         raise HTTPException(status_code=500, detail="Failed to clear session")
 
 
@@ -326,12 +574,12 @@ async def get_sessions_stats():
         return stats
 
     except Exception as e:
-        logger.error(f"Error retrieving session stats: {e}")
+        logger.error("Error retrieving session stats: %s", e)
         raise HTTPException(status_code=500, detail="Failed to retrieve session stats")
 
 
 @router.get("/budget/status")
-async def get_budget_status(db: AsyncSession = Depends(get_db)):
+async def get_budget_status(db: AsyncSession = Depends(get_db_ro)):
     """
     Get current cost budget status.
 
@@ -343,5 +591,5 @@ async def get_budget_status(db: AsyncSession = Depends(get_db)):
         return budget_status
 
     except Exception as e:
-        logger.error(f"Error retrieving budget status: {e}")
+        logger.error("Error retrieving budget status: %s", e)
         raise HTTPException(status_code=500, detail="Failed to retrieve budget status")
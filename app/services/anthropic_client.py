@@ -0,0 +1,22 @@
+"""
+Shared Anthropic HTTP Client
+
+Shared httpx connection pools for the Anthropic clients in the process, so
+every API call reuses warm TLS connections.
+"""
+import anthropic
+import httpx
+
+# httpx drops idle keep-alive connections after 5s by default, which is
+# shorter than the gap between most chat turns
+ANTHROPIC_CONNECTION_LIMITS = httpx.Limits(
+    max_connections=100,
+    max_keepalive_connections=20,
+    keepalive_expiry=60.0,
+)
+
+# Sync pool for the intent classifier (runs in worker threads)
+http_client = anthropic.DefaultHttpxClient(limits=ANTHROPIC_CONNECTION_LIMITS)
+
+# Async pool for response generation on the event loop
+async_http_client = anthropic.DefaultAsyncHttpxClient(limits=ANTHROPIC_CONNECTION_LIMITS)
@@ -4,20 +4,27 @@ Context Loader Service
 Loads portfolio context files based on detected intents.
 Manages context file reading, caching, and formatting for LLM prompts.
 """
-from typing import List, Dict, Optional
+from typing import List, Dict, NamedTuple, Optional, Tuple
 from pathlib import Path
+import sys
 import time
 from app.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
 
+class CacheEntry(NamedTuple):
+    """Cached context string and its time.monotonic() expiry"""
+    content: str
+    expires_at: float
+
+
 class ContextLoader:
     """
     Loads and manages portfolio context files for LLM prompts.
 
     Features:
-    - Loads .txt files from context/ directory
+    - Loads .txt files from context/ directory (preloaded at startup)
     - Caches frequently accessed context (15-minute TTL)
     - Maps intents to relevant context files
     - Formats context for LLM consumption
@@ -31,18 +38,43 @@ class ContextLoader:
             context_dir: Directory containing context files (default: "context")
         """
         self.context_dir = Path(context_dir)
-        self.cache: Dict[str, Dict[str, any]] = {}
+        self.cache: Dict[str, CacheEntry] = {}
         self.cache_ttl = 900  # 15 minutes in seconds
 
+        # Final formatted strings keyed by (context files, include_headers)
+        self._formatted_cache: Dict[Tuple[Tuple[str, ...], bool], CacheEntry] = {}
+
+        # Section headers per context file, e.g. "=== SKILLS ==="
+        self._headers: Dict[str, str] = {}
+
+        # Cache keys per context file, e.g. "context_skills"
+        self._cache_keys: Dict[str, str] = {}
+
         # Verify context directory exists
         if not self.context_dir.exists():
             raise FileNotFoundError(f"Context directory not found: {self.context_dir}")
 
-        logger.info(f"Context loader initialized with directory: {self.context_dir}")
+        # Context files are small and static: read them all once up front so
+        # the request path never touches the disk. clear_cache() re-reads them.
+        self._store: Dict[str, str] = {}
+        for file_path in sorted(self.context_dir.glob("*.txt")):
+            content = self._read_file_from_disk(file_path.stem)
+            if content:
+                self._store[file_path.stem] = content
+
+        logger.info(
+            f"Context loader initialized with directory: {self.context_dir} "
+            f"({len(self._store)} files preloaded)"
+        )
 
     def _get_cache_key(self, filename: str) -> str:
-        """Generate cache key for a context file."""
-        return f"context_{filename}"
+        """Get the (memoized) cache key for a context file."""
+        cache_key = self._cache_keys.get(filename)
+        if cache_key is None:
+            # Reusing one string object per file also reuses its cached hash
+            cache_key = sys.intern(f"context_{filename}")
+            self._cache_keys[filename] = cache_key
+        return cache_key
 
     def _is_cache_valid(self, cache_key: str) -> bool:
         """
@@ -54,15 +86,29 @@ class ContextLoader:
         Returns:
             True if cache exists and is not expired
         """
-        if cache_key not in self.cache:
-            return False
+        entry = self.cache.get(cache_key)
+        return entry is not None and entry.expires_at > time.monotonic()
 
-        cached_time = self.cache[cache_key].get("timestamp", 0)
-        current_time = time.time()
+    def _read_context_file(self, filename: str) -> Optional[str]:
+        """
+        Read a context file, from the preloaded store when possible.
 
-        return (current_time - cached_time) < self.cache_ttl
+        Files added after startup are read from disk and kept in the store.
 
-    def _read_context_file(self, filename: str) -> Optional[str]:
+        Args:
+            filename: Name of the context file (without .txt extension)
+
+        Returns:
+            Content of the file or None if not found
+        """
+        content = self._store.get(filename)
+        if content is None:
+            content = self._read_file_from_disk(filename)
+            if content:
+                self._store[filename] = content
+        return content
+
+    def _read_file_from_disk(self, filename: str) -> Optional[str]:
         """
         Read a context file from disk.
 
@@ -74,19 +120,19 @@ class ContextLoader:
         """
         file_path = self.context_dir / f"{filename}.txt"
 
-        if not file_path.exists():
-            logger.warning(f"Context file not found: {file_path}")
-            return None
-
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read().strip()
+            # read_bytes() skips the buffered text wrapper (and its extra
+            # stat/seek/isatty calls) of open().read()
+            content = file_path.read_bytes().decode('utf-8').strip()
 
-            logger.info(f"Successfully read context file: {filename}.txt ({len(content)} chars)")
+            logger.info("Successfully read context file: %s.txt (%d chars)", filename, len(content))
             return content
 
+        except FileNotFoundError:
+            logger.warning("Context file not found: %s", file_path)
+            return None
         except Exception as e:
-            logger.error(f"Error reading context file {filename}.txt: {e}")
+            logger.error("Error reading context file %s.txt: %s", filename, e)
             return None
 
     def load_context(self, filename: str, use_cache: bool = True) -> Optional[str]:
@@ -104,19 +150,17 @@ class ContextLoader:
 
         # Check cache first
         if use_cache and self._is_cache_valid(cache_key):
-            logger.info(f"Using cached context for: {filename}.txt")
-            return self.cache[cache_key]["content"]
+            logger.debug("Using cached context for: %s.txt", filename)
+            return self.cache[cache_key].content
 
         # Read from disk
         content = self._read_context_file(filename)
 
-        # Cache the result
+        # Cache the result; re-inserting keeps self.cache ordered oldest first
         if content and use_cache:
-            self.cache[cache_key] = {
-                "content": content,
-                "timestamp": time.time()
-            }
-            logger.info(f"Cached context for: {filename}.txt")
+            self.cache.pop(cache_key, None)
+            self.cache[cache_key] = CacheEntry(content, time.monotonic() + self.cache_ttl)
+            logger.info("Cached context for: %s.txt", filename)
 
         return content
 
@@ -142,9 +186,18 @@ class ContextLoader:
             if content:
                 contexts[filename] = content
 
-        logger.info(f"Loaded {len(contexts)} context files: {list(contexts.keys())}")
+        logger.info("Loaded %d context files: %s", len(contexts), list(contexts))
         return contexts
 
+    def _section_header(self, filename: str) -> str:
+        """Get the (cached) section header for a context file."""
+        header = self._headers.get(filename)
+        if header is None:
+            # Create a clear section header
+            header = f"=== {filename.upper().replace('_', ' ')} ==="
+            self._headers[filename] = header
+        return header
+
     def format_context_for_llm(
         self,
         contexts: Dict[str, str],
@@ -163,20 +216,16 @@ class ContextLoader:
         if not contexts:
             return ""
 
-        formatted_sections = []
-
-        for filename, content in contexts.items():
-            if include_headers:
-                # Create a clear section header
-                header = f"=== {filename.upper().replace('_', ' ')} ==="
-                formatted_sections.append(f"{header}\n{content}")
-            else:
-                formatted_sections.append(content)
-
         # Join with double newlines for clear separation
-        formatted_context = "\n\n".join(formatted_sections)
+        if include_headers:
+            formatted_context = "\n\n".join(
+                f"{self._section_header(filename)}\n{content}"
+                for filename, content in contexts.items()
+            )
+        else:
+            formatted_context = "\n\n".join(contexts.values())
 
-        logger.info(f"Formatted context: {len(formatted_context)} chars from {len(contexts)} files")
+        logger.debug("Formatted context: %d chars from %d files", len(formatted_context), len(contexts))
         return formatted_context
 
     def get_context_for_intents(
@@ -203,13 +252,25 @@ class ContextLoader:
         # Map intents to context files
         context_files = intent_classifier.map_intent_to_context_files(intents)
 
+        # Reuse the formatted string for this file set if it is still fresh
+        formatted_key = (tuple(context_files), include_headers)
+        if use_cache:
+            cached = self._formatted_cache.get(formatted_key)
+            if cached and cached.expires_at > time.monotonic():
+                return cached.content
+
         # Load all relevant contexts
         contexts = self.load_multiple_contexts(context_files, use_cache=use_cache)
 
         # Format for LLM
         formatted_context = self.format_context_for_llm(contexts, include_headers=include_headers)
 
-        logger.info(f"Generated context for intents {intents}: {len(formatted_context)} chars")
+        if use_cache:
+            self._formatted_cache[formatted_key] = CacheEntry(
+                formatted_context, time.monotonic() + self.cache_ttl
+            )
+
+        logger.info("Generated context for intents %s: %d chars", intents, len(formatted_context))
         return formatted_context
 
     def clear_cache(self, filename: Optional[str] = None):
@@ -223,9 +284,16 @@ class ContextLoader:
             cache_key = self._get_cache_key(filename)
             if cache_key in self.cache:
                 del self.cache[cache_key]
-                logger.info(f"Cleared cache for: {filename}.txt")
+                logger.info("Cleared cache for: %s.txt", filename)
+            # Drop formatted strings built from this file
+            for key in [k for k in self._formatted_cache if filename in k[0]]:
+                del self._formatted_cache[key]
+            # Pick up edits on disk
+            self._store.pop(filename, None)
         else:
             self.cache.clear()
+            self._formatted_cache.clear()
+            self._store.clear()
             logger.info("Cleared all context cache")
 
     def get_cache_stats(self) -> Dict[str, any]:
@@ -235,16 +303,20 @@ class ContextLoader:
         Returns:
             Dictionary with cache stats
         """
-        current_time = time.time()
-        valid_entries = sum(
-            1 for entry in self.cache.values()
-            if (current_time - entry["timestamp"]) < self.cache_ttl
-        )
+        current_time = time.monotonic()
+
+        # Entries are ordered oldest first, so expired ones form a prefix and
+        # the scan stops at the first valid entry
+        expired_entries = 0
+        for entry in self.cache.values():
+            if entry.expires_at > current_time:
+                break
+            expired_entries += 1
 
         return {
             "total_entries": len(self.cache),
-            "valid_entries": valid_entries,
-            "expired_entries": len(self.cache) - valid_entries,
+            "valid_entries": len(self.cache) - expired_entries,
+            "expired_entries": expired_entries,
             "cache_ttl_seconds": self.cache_ttl
         }
 
@@ -4,15 +4,37 @@ Conversation History Manager
 Manages conversation history for chatbot sessions using Redis for caching.
 Provides context-aware conversations by maintaining message history.
 """
-from typing import List, Dict, Optional
-import json
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import Deque, List, Dict, Optional
+import orjson
 import redis
-from datetime import datetime, timedelta, timezone
+from datetime import timedelta
+import time
 from app.config import settings
+from app.utils.dates import utc_now_iso
 from app.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
+# Append a message, keep the last N and refresh the TTL in one server-side call
+# KEYS[1] = history key, ARGV = [message, history_length, ttl_seconds]
+APPEND_MESSAGE_SCRIPT = """
+redis.call('RPUSH', KEYS[1], ARGV[1])
+redis.call('LTRIM', KEYS[1], -tonumber(ARGV[2]), -1)
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[3]))
+return 1
+"""
+
+# Rough characters-per-token ratio for English text, used to budget history
+# without pulling in a tokenizer
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of a piece of text"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
 
 class ConversationManager:
     """
@@ -26,6 +48,10 @@ class ConversationManager:
     - Graceful fallback when Redis is unavailable
     """
 
+    # Sessions kept by the in-memory fallback before the least recently
+    # written are evicted
+    MEMORY_MAX_SESSIONS = 10_000
+
     def __init__(
         self,
         redis_url: Optional[str] = None,
@@ -43,6 +69,7 @@ class ConversationManager:
         self.redis_url = redis_url or settings.redis_url
         self.history_length = history_length
         self.session_ttl = timedelta(hours=session_ttl_hours)
+        self.session_ttl_seconds = int(self.session_ttl.total_seconds())
         self.redis_client: Optional[redis.Redis] = None
         self.use_redis = True
 
@@ -50,19 +77,28 @@ class ConversationManager:
         try:
             self.redis_client = redis.from_url(
                 self.redis_url,
-                decode_responses=True,
+                # Values are orjson payloads, parsed straight from bytes
+                decode_responses=False,
                 socket_connect_timeout=10,  # Increased for Railway's internal DNS
+                # TCP keepalive detects dead peers; no PING before commands on
+                # idle connections (a broken connection is retried once)
                 socket_keepalive=True,
-                health_check_interval=30
+                retry_on_timeout=True
             )
             # Test connection
             self.redis_client.ping()
+            # Sent with EVALSHA; redis-py falls back to EVAL if the server
+            # has not cached the script yet
+            self._append_script = self.redis_client.register_script(APPEND_MESSAGE_SCRIPT)
             logger.info(f"Conversation manager initialized with Redis: {self.redis_url}")
         except Exception as e:
             self.use_redis = False
             logger.warning(f"Redis not available, using in-memory fallback: {e}")
             # Fallback to in-memory storage
-            self._memory_store: Dict[str, List[Dict]] = {}
+            # Per-session deques drop the oldest message on append
+            self._memory_store: Dict[str, Deque[Dict]] = {}
+            # time.monotonic() expiry per session, ordered by last write
+            self._memory_expires: OrderedDict[str, float] = OrderedDict()
 
     def _get_session_key(self, session_id: str) -> str:
         """Generate Redis key for a session."""
@@ -94,7 +130,7 @@ class ConversationManager:
         message = {
             "role": role,
             "content": content,
-            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "timestamp": utc_now_iso(),
             "metadata": metadata or {}
         }
 
@@ -111,31 +147,55 @@ class ConversationManager:
         """Add message to Redis."""
         key = self._get_session_key(session_id)
 
-        # Add message to list
-        self.redis_client.rpush(key, json.dumps(message))
-
-        # Trim to keep only recent messages
-        self.redis_client.ltrim(key, -self.history_length, -1)
-
-        # Set expiration
-        self.redis_client.expire(key, int(self.session_ttl.total_seconds()))
-
-        logger.info(f"Added {message['role']} message to session {session_id} (Redis)")
+        # Add message, trim to recent messages and set expiration in one
+        # atomic round-trip
+        self._append_script(
+            keys=[key],
+            args=[
+                orjson.dumps(message),
+                self.history_length,
+                self.session_ttl_seconds,
+            ],
+        )
+
+        logger.debug("Added %s message to session %s (Redis)", message["role"], session_id)
         return True
 
     def _add_message_memory(self, session_id: str, message: Dict) -> bool:
         """Add message to in-memory store."""
-        if session_id not in self._memory_store:
-            self._memory_store[session_id] = []
+        now = time.monotonic()
+        history = self._memory_store.get(session_id)
+        if history is None or not self._memory_alive(session_id, now):
+            history = self._memory_store[session_id] = deque(maxlen=self.history_length)
 
-        self._memory_store[session_id].append(message)
+        # Keeps only recent messages
+        history.append(message)
 
-        # Keep only recent messages
-        self._memory_store[session_id] = self._memory_store[session_id][-self.history_length:]
+        # Moving to the end keeps the expiry dict ordered by last write, like
+        # the TTL refresh on every Redis append
+        self._memory_expires[session_id] = now + self.session_ttl_seconds
+        self._memory_expires.move_to_end(session_id)
+        self._prune_memory_store(now)
 
-        logger.info(f"Added {message['role']} message to session {session_id} (Memory)")
+        logger.debug("Added %s message to session %s (Memory)", message["role"], session_id)
         return True
 
+    def _memory_alive(self, session_id: str, now: float) -> bool:
+        """Check that an in-memory session has not outlived the session TTL."""
+        return self._memory_expires.get(session_id, 0.0) > now
+
+    def _prune_memory_store(self, now: float):
+        """Drop expired sessions, and the least recently written beyond the cap."""
+        # Oldest writes come first, so expired sessions form a prefix and
+        # only the sessions actually dropped are visited
+        expires = self._memory_expires
+        while expires:
+            session_id, expires_at = next(iter(expires.items()))
+            if expires_at > now and len(expires) <= self.MEMORY_MAX_SESSIONS:
+                break
+            expires.popitem(last=False)
+            self._memory_store.pop(session_id, None)
+
     def get_history(
         self,
         session_id: str,
@@ -170,29 +230,34 @@ class ConversationManager:
         if not messages_json:
             return []
 
-        messages = [json.loads(msg) for msg in messages_json]
+        messages = [orjson.loads(msg) for msg in messages_json]
 
         # Apply limit if specified
         if limit:
             messages = messages[-limit:]
 
-        logger.info(f"Retrieved {len(messages)} messages from session {session_id} (Redis)")
+        logger.debug("Retrieved %d messages from session %s (Redis)", len(messages), session_id)
         return messages
 
     def _get_history_memory(self, session_id: str, limit: Optional[int]) -> List[Dict]:
         """Get history from in-memory store."""
-        messages = self._memory_store.get(session_id, [])
+        history = self._memory_store.get(session_id, ())
+        if history and not self._memory_alive(session_id, time.monotonic()):
+            history = ()
 
-        if limit:
-            messages = messages[-limit:]
+        if limit and limit < len(history):
+            messages = list(islice(history, len(history) - limit, None))
+        else:
+            messages = list(history)
 
-        logger.info(f"Retrieved {len(messages)} messages from session {session_id} (Memory)")
+        logger.debug("Retrieved %d messages from session %s (Memory)", len(messages), session_id)
         return messages
 
     def format_history_for_llm(
         self,
         session_id: str,
-        limit: Optional[int] = None
+        limit: Optional[int] = None,
+        max_tokens: Optional[int] = None
     ) -> List[Dict[str, str]]:
         """
         Format conversation history for LLM API.
@@ -203,19 +268,36 @@ class ConversationManager:
         Args:
             session_id: Unique session identifier
             limit: Optional limit on number of messages
+            max_tokens: Optional estimated token budget; oldest messages are
+                dropped first until the history fits
 
         Returns:
             List of messages formatted for LLM
         """
         history = self.get_history(session_id, limit)
 
+        if max_tokens is not None:
+            # Walk newest-first so a single long paste evicts old turns
+            # instead of the most recent context
+            used = 0
+            start = len(history)
+            while start > 0:
+                used += estimate_tokens(history[start - 1]["content"])
+                if used > max_tokens:
+                    break
+                start -= 1
+            # The API expects the conversation to open with a user turn
+            if start < len(history) and history[start]["role"] == "assistant":
+                start += 1
+            history = history[start:]
+
         # Convert to LLM format (only role and content)
         llm_messages = [
             {"role": msg["role"], "content": msg["content"]}
             for msg in history
         ]
 
-        logger.info(f"Formatted {len(llm_messages)} messages for LLM (session {session_id})")
+        logger.debug("Formatted %d messages for LLM (session %s)", len(llm_messages), session_id)
         return llm_messages
 
     def get_context_summary(self, session_id: str) -> Dict:
@@ -230,25 +312,30 @@ class ConversationManager:
         """
         history = self.get_history(session_id)
 
-        user_messages = [msg for msg in history if msg["role"] == "user"]
-        assistant_messages = [msg for msg in history if msg["role"] == "assistant"]
-
-        # Extract intents from metadata
-        intents = []
+        # Single pass over history for role counts and intents
+        user_count = 0
+        assistant_count = 0
+        intents = set()
         for msg in history:
-            if "metadata" in msg and "intent" in msg["metadata"]:
-                intent = msg["metadata"]["intent"]
+            if msg["role"] == "user":
+                user_count += 1
+            elif msg["role"] == "assistant":
+                assistant_count += 1
+
+            # Extract intents from metadata
+            intent = msg.get("metadata", {}).get("intent")
+            if intent is not None:
                 if isinstance(intent, list):
-                    intents.extend(intent)
+                    intents.update(intent)
                 else:
-                    intents.append(intent)
+                    intents.add(intent)
 
         return {
             "session_id": session_id,
             "total_messages": len(history),
-            "user_messages": len(user_messages),
-            "assistant_messages": len(assistant_messages),
-            "unique_intents": list(set(intents)),
+            "user_messages": user_count,
+            "assistant_messages": assistant_count,
+            "unique_intents": list(intents),
             "last_updated": history[-1]["timestamp"] if history else None
         }
 
@@ -268,8 +355,8 @@ class ConversationManager:
                 self.redis_client.delete(key)
                 logger.info(f"Cleared history for session {session_id} (Redis)")
             else:
-                if session_id in self._memory_store:
-                    del self._memory_store[session_id]
+                self._memory_store.pop(session_id, None)
+                self._memory_expires.pop(session_id, None)
                 logger.info(f"Cleared history for session {session_id} (Memory)")
             return True
         except Exception as e:
@@ -291,7 +378,10 @@ class ConversationManager:
                 key = self._get_session_key(session_id)
                 return self.redis_client.exists(key) > 0
             else:
-                return session_id in self._memory_store and len(self._memory_store[session_id]) > 0
+                return (
+                    len(self._memory_store.get(session_id, ())) > 0
+                    and self._memory_alive(session_id, time.monotonic())
+                )
         except Exception as e:
             logger.error(f"Failed to check session existence {session_id}: {e}")
             return False
@@ -305,14 +395,21 @@ class ConversationManager:
         """
         try:
             if self.use_redis and self.redis_client:
-                # Count sessions in Redis
-                keys = self.redis_client.keys("chat:session:*:history")
+                # Count sessions in Redis. SCAN walks the keyspace in small
+                # batches instead of blocking the server like KEYS would.
+                # A live counter would drift as sessions expire via TTL.
+                active_sessions = sum(
+                    1 for _ in self.redis_client.scan_iter(
+                        match="chat:session:*:history", count=1000
+                    )
+                )
                 return {
                     "storage": "redis",
-                    "active_sessions": len(keys),
+                    "active_sessions": active_sessions,
                     "redis_connected": True
                 }
             else:
+                self._prune_memory_store(time.monotonic())
                 return {
                     "storage": "memory",
                     "active_sessions": len(self._memory_store),
@@ -5,13 +5,58 @@ Classifies user messages into intents to determine which context to load.
 Uses LLM (Claude Haiku) for accurate classification (~$0.00001 per call).
 Falls back to keyword matching if LLM is unavailable.
 """
-from typing import List, Optional
+from functools import lru_cache
+import re
+from typing import List, Optional, Tuple
 import anthropic
 from app.config import settings
+from app.services.anthropic_client import http_client
 from app.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
+# Whole-message greetings and small talk that need no classification call
+GREETINGS = frozenset({
+    "hi", "hello", "hey", "hi there", "hello there", "hey there", "greetings",
+    "good morning", "good afternoon", "good evening", "howdy", "yo",
+})
+SMALL_TALK = frozenset({
+    "thanks", "thank you", "thanks a lot", "thank you so much", "thx", "ty",
+    "cool", "awesome", "great", "nice", "ok", "okay", "alright", "got it",
+    "sounds good", "makes sense", "understood", "i see",
+})
+
+# Keyword score at which a portfolio intent is trusted without an LLM call
+KEYWORD_CONFIDENCE_SCORE = 3
+# Keyword results that are too loose to skip the LLM for: general keywords
+# ("what", "who", "about") fit almost any question, and greeting or casual
+# words often open a real question ("hi, what projects...")
+_UNCERTAIN_INTENTS = frozenset({"greeting", "normal", "general"})
+
+
+# Context files loaded for each intent. Greetings and casual conversation
+# ("normal") need no context.
+INTENT_CONTEXT_FILES = {
+    "normal": (),
+    "greeting": (),
+    "skills": ("skills", "general"),
+    "experience": ("experience", "general"),
+    "projects": ("projects", "general"),
+    "education": ("education", "general"),
+    "contact": ("contact", "general"),
+    "general": ("general",),
+}
+
+
+def _keyword_regex(keywords: List[str]) -> re.Pattern:
+    """
+    Compile keywords into one whole-word alternation.
+
+    Longer keywords are tried first, so "worked at" wins over "worked".
+    """
+    alternation = "|".join(map(re.escape, sorted(keywords, key=len, reverse=True)))
+    return re.compile(rf"\b(?:{alternation})\b")
+
 
 class IntentClassifier:
     """
@@ -32,7 +77,10 @@ class IntentClassifier:
         """Initialize intent patterns and LLM client"""
         # Initialize Anthropic client
         try:
-            self.client = anthropic.Anthropic(api_key=settings.anthropic_api_key)
+            self.client = anthropic.Anthropic(
+                api_key=settings.anthropic_api_key,
+                http_client=http_client
+            )
             self.use_llm = True
             logger.info("Intent classifier initialized with LLM support")
         except Exception as e:
@@ -94,10 +142,27 @@ class IntentClassifier:
             ]
         }
 
+        # One compiled alternation per intent, so each intent is a single
+        # regex scan instead of a Python loop over its keywords
+        self._intent_res = tuple(
+            (intent, _keyword_regex(keywords))
+            for intent, keywords in self.intent_patterns.items()
+        )
+        self._greeting_re = _keyword_regex(self.intent_patterns["greeting"])
+
+        # Repeated messages ("hi", "thanks", ...) skip scoring entirely
+        self._keyword_intents = lru_cache(maxsize=1024)(self._score_keywords)
+
+        # LLM results per normalized message; failed calls are not cached
+        self._llm_intents = lru_cache(maxsize=2048)(self._request_llm_intents)
+
     def classify_with_llm(self, message: str) -> List[str]:
         """
         Classify message using LLM for accurate intent detection.
 
+        Repeated messages (after lowercasing and collapsing whitespace) reuse
+        the earlier result instead of making another API call.
+
         Args:
             message: User's message
 
@@ -105,13 +170,20 @@ class IntentClassifier:
             List of detected intents
         """
         try:
-            response = self.client.messages.create(
-                model="claude-3-5-haiku-20241022",
-                max_tokens=50,
-                temperature=0,
-                messages=[{
-                    "role": "user",
-                    "content": f"""Classify this user message into one or more of these intents:
+            return list(self._llm_intents(" ".join(message.lower().split())))
+        except Exception as e:
+            logger.error(f"LLM classification failed: {e}")
+            return self.classify_with_keywords(message)
+
+    def _request_llm_intents(self, message: str) -> Tuple[str, ...]:
+        """Ask the LLM to classify a normalized message."""
+        response = self.client.messages.create(
+            model="claude-3-5-haiku-20241022",
+            max_tokens=50,
+            temperature=0,
+            messages=[{
+                "role": "user",
+                "content": f"""Classify this user message into one or more of these intents:
 - normal: Casual conversation, small talk (e.g., "how are you?", "what's up?", "nice!", "thanks", "cool")
 - greeting: Initial greetings only (e.g., "hello", "hi", "hey")
 - skills: Questions about technical skills, technologies, programming languages, expertise
@@ -127,26 +199,22 @@ Return ONLY the intent names as a comma-separated list (e.g., "skills,general" o
 IMPORTANT: If the message is casual conversation like "how are you?" or small talk, classify it as "normal".
 If the message is asking how to contact/reach out/get in touch/email, classify it as "contact".
 Return maximum 2 intents, ordered by relevance."""
-                }]
-            )
+            }]
+        )
 
-            # Parse response
-            intents_str = response.content[0].text.strip().lower()
-            intents = [intent.strip() for intent in intents_str.split(",")]
+        # Parse response
+        intents_str = response.content[0].text.strip().lower()
+        intents = [intent.strip() for intent in intents_str.split(",")]
 
-            # Validate intents
-            valid_intents = ["normal", "greeting", "skills", "experience", "projects", "education", "contact", "general"]
-            filtered_intents = [i for i in intents if i in valid_intents]
+        # Validate intents
+        valid_intents = ["normal", "greeting", "skills", "experience", "projects", "education", "contact", "general"]
+        filtered_intents = [i for i in intents if i in valid_intents]
 
-            if not filtered_intents:
-                filtered_intents = ["general"]
+        if not filtered_intents:
+            filtered_intents = ["general"]
 
-            logger.info(f"LLM classified message into intents: {filtered_intents}")
-            return filtered_intents[:3]  # Max 3
-
-        except Exception as e:
-            logger.error(f"LLM classification failed: {e}")
-            return self.classify_with_keywords(message)
+        logger.info(f"LLM classified message into intents: {filtered_intents}")
+        return tuple(filtered_intents[:3])  # Max 3
 
     def classify_with_keywords(self, message: str) -> List[str]:
         """
@@ -158,27 +226,45 @@ Return maximum 2 intents, ordered by relevance."""
         Returns:
             List of detected intents
         """
-        if not message or not message.strip():
+        if not message or message.isspace():
             return ["general"]
 
+        # Copy so callers cannot mutate the memoized result
+        detected_intents = list(self._keyword_intents(message)[0])
+        logger.info(f"Keyword-based classification: {detected_intents}")
+        return detected_intents
+
+    def _score_keywords(self, message: str) -> Tuple[Tuple[str, ...], int]:
+        """
+        Score a non-empty message against the keyword patterns.
+
+        Returns:
+            Tuple of (detected intents, keyword score of the first intent)
+        """
         message_lower = message.lower().strip()
+
+        # Bare greetings and small talk need no scoring (same sets as the
+        # fast path in classify, for callers that come here directly)
+        trivial = message_lower.strip(" .,!?")
+        if trivial in GREETINGS:
+            return ("greeting",), 0
+        if trivial in SMALL_TALK:
+            return ("normal",), 0
+
         detected_intents = []
         intent_scores = {}
 
         # Check for greeting at the start
-        if any(message_lower.startswith(pattern) for pattern in self.intent_patterns["greeting"]):
+        if self._greeting_re.match(message_lower):
             detected_intents.append("greeting")
 
         # Score each intent based on keyword matches
-        for intent, keywords in self.intent_patterns.items():
+        for intent, pattern in self._intent_res:
             if intent == "greeting" and "greeting" in detected_intents:
                 continue  # Already detected
 
-            score = 0
-            for keyword in keywords:
-                if keyword in message_lower:
-                    # Longer keywords get higher scores
-                    score += len(keyword.split())
+            # Each distinct keyword counts once; longer keywords get higher scores
+            score = sum(len(keyword.split()) for keyword in set(pattern.findall(message_lower)))
 
             if score > 0:
                 intent_scores[intent] = score
@@ -195,8 +281,7 @@ Return maximum 2 intents, ordered by relevance."""
         if not detected_intents:
             detected_intents.append("general")
 
-        logger.info(f"Keyword-based classification: {detected_intents}")
-        return detected_intents
+        return tuple(detected_intents), intent_scores.get(detected_intents[0], 0)
 
     def classify(self, message: str) -> List[str]:
         """
@@ -209,10 +294,23 @@ Return maximum 2 intents, ordered by relevance."""
         Returns:
             List of detected intents, ordered by relevance
         """
-        if not message or not message.strip():
+        if not message or message.isspace():
             return ["general"]
 
+        # Fast path: bare greetings and small talk skip the LLM round-trip
+        normalized = message.lower().strip(" .,!?")
+        if normalized in GREETINGS:
+            return ["greeting"]
+        if normalized in SMALL_TALK:
+            return ["normal"]
+
         if self.use_llm and self.client:
+            # Clear-cut portfolio questions ("what python and sql tools do
+            # you know") are left to the keyword matcher
+            intents, top_score = self._keyword_intents(message)
+            if top_score >= KEYWORD_CONFIDENCE_SCORE and intents[0] not in _UNCERTAIN_INTENTS:
+                logger.info(f"Keyword-based classification (confident): {list(intents)}")
+                return list(intents)
             return self.classify_with_llm(message)
         else:
             return self.classify_with_keywords(message)
@@ -255,36 +353,23 @@ Return maximum 2 intents, ordered by relevance."""
         Returns:
             List of context file names (without .txt extension)
         """
-        context_files = set()
+        return list(self._context_files_for(tuple(intents)))
 
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def _context_files_for(intents: Tuple[str, ...]) -> Tuple[str, ...]:
+        """
+        Memoized intent -> context file mapping.
+
+        Files are returned sorted so the same intents always produce the same
+        context order (and the same prompt prefix) in every worker.
+        """
+        context_files = set()
         for intent in intents:
-            if intent == "normal":
-                # No context needed for casual conversation
-                pass
-            elif intent == "greeting":
-                # No context for greetings either
-                pass
-            elif intent == "skills":
-                context_files.add("skills")
-                context_files.add("general")
-            elif intent == "experience":
-                context_files.add("experience")
-                context_files.add("general")
-            elif intent == "projects":
-                context_files.add("projects")
-                context_files.add("general")
-            elif intent == "education":
-                context_files.add("education")
-                context_files.add("general")
-            elif intent == "contact":
-                context_files.add("contact")
-                context_files.add("general")
-            elif intent == "general":
-                # Load general for now, more specific context if needed
-                context_files.add("general")
-
-        logger.info(f"Mapped intents {intents} to context files: {list(context_files)}")
-        return list(context_files)
+            context_files.update(INTENT_CONTEXT_FILES.get(intent, ()))
+
+        logger.info(f"Mapped intents {list(intents)} to context files: {sorted(context_files)}")
+        return tuple(sorted(context_files))
 
 
 # Global classifier instance
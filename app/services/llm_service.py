@@ -4,13 +4,82 @@ LLM Service
 Integrates with Anthropic Claude API for generating chatbot responses.
 Includes prompt caching, cost tracking, and error handling.
 """
-from typing import List, Dict, Optional, Tuple
+from functools import lru_cache
+from typing import AsyncIterator, Awaitable, Callable, List, Dict, Optional, Tuple
+import asyncio
+import re
+import time
 import anthropic
 from app.config import settings
+from app.services.anthropic_client import async_http_client
+from app.services.local_llm import local_casual_llm
 from app.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
+# Usage reported for answers served without an API call
+_NO_USAGE = {
+    "input_tokens": 0,
+    "output_tokens": 0,
+    "cache_creation_tokens": 0,
+    "cache_read_tokens": 0,
+    "total_tokens": 0,
+    "cost_usd": 0.0
+}
+
+
+# Canned reply to greetings (no API call)
+_GREETING_BODY = (
+    "I'm Anirudh. I can tell you about my professional background, "
+    "skills, experience, projects, and how to get in touch with me. "
+    "What would you like to know?"
+)
+_GREETING = "Hello! " + _GREETING_BODY
+
+# Start of each item in a numbered reply from generate_batched
+_NUMBERED_ITEM_RE = re.compile(r"^\s*\d+[.)]\s", re.MULTILINE)
+
+
+# System prompt for professional questions, split around the portfolio
+# context so the context can be sent as its own cacheable block
+SYSTEM_PROMPT_INTRO = """You are Anirudh Nuti. You are directly communicating with visitors on your portfolio website. Answer questions about yourself in the first person as if you are speaking directly to them.
+
+YOUR INFORMATION:
+"""
+
+SYSTEM_PROMPT_RULES = """
+
+CRITICAL RULES - FOLLOW STRICTLY:
+1. ONLY use information explicitly stated in YOUR INFORMATION above - NEVER make up or assume details
+2. If something is not in your information, say "I don't have that information in my portfolio" - DO NOT guess or hallucinate
+3. Answer ONLY what is asked - be direct and concise
+4. Keep responses brief (2-3 sentences) unless the question specifically asks for detailed information
+5. DO NOT volunteer extra information that wasn't asked for
+6. When sharing links (email, LinkedIn, GitHub, portfolio), provide the full URL exactly as shown in your information
+
+RESPONSE GUIDELINES:
+1. Always speak in first person (I, me, my) - visitors are talking directly to YOU
+2. Be professional, friendly, and conversational
+3. For contact inquiries, provide email and LinkedIn with full URLs
+4. If asked about specific skills/projects/experience, cite relevant details from your information
+5. Use a warm but professional tone
+
+Remember: Answer ONLY what is asked. Be accurate, concise, and authentic. If you don't know something, say so - never make things up!"""
+
+# System prompt for casual conversation (no portfolio context)
+CASUAL_SYSTEM_PROMPT = """You are Anirudh Nuti. You're having a casual, friendly conversation with a visitor on your portfolio website.
+
+GUIDELINES:
+1. Always speak in first person (I, me, my) - be yourself
+2. Be warm, friendly, and personable
+3. Keep responses very brief (1-2 sentences max) for casual conversation
+4. Don't be overly formal - this is just chitchat
+5. Feel free to show personality and enthusiasm
+6. If they ask about your professional work, briefly mention you're a data engineer/full-stack developer and suggest they ask specific questions
+7. DO NOT share URLs or technical details in casual mode - save that for when they ask specific questions
+
+Remember: Keep it natural and SHORT. Just friendly chitchat - not a presentation!"""
+
 
 class LLMService:
     """
@@ -33,6 +102,16 @@ class LLMService:
         "cache_read": 0.08 / 1_000_000,         # $0.08 per million tokens (90% discount)
     }
 
+    # Message Batches API requests cost half the standard price
+    BATCH_PRICE_FACTOR = 0.5
+
+    # Ephemeral cache entries expire after 5 minutes without a hit
+    CACHE_REFRESH_SECONDS = 240
+
+    # In-process answers to first messages (no conversation history)
+    RESPONSE_CACHE_TTL_SECONDS = 600
+    RESPONSE_CACHE_MAX_ENTRIES = 512
+
     def __init__(
         self,
         api_key: Optional[str] = None,
@@ -53,16 +132,37 @@ class LLMService:
         self.model = model or settings.llm_model
         self.max_tokens = max_tokens or settings.max_tokens
         self.temperature = temperature or settings.temperature
+        self.max_history_messages = 2 * settings.max_history_turns
+
+        # Optional local model for casual turns (None when not configured)
+        self.casual_llm = local_casual_llm
+
+        # Portfolio context -> last time a real request used its cached prefix
+        self._cache_last_used: Dict[str, float] = {}
+
+        # (normalized message, context) -> (response text, stored at), and
+        # the API calls currently in flight for those keys
+        self._response_cache: Dict[Tuple[str, Optional[str]], Tuple[str, float]] = {}
+        self._inflight: Dict[Tuple[str, Optional[str]], asyncio.Future] = {}
 
         # Initialize Anthropic client
         try:
-            self.client = anthropic.Anthropic(api_key=self.api_key)
-            logger.info(f"LLM service initialized with model: {self.model}")
+            # Async client: concurrent chats overlap on the API round-trip
+            # instead of each holding a worker thread. The SDK retries
+            # 408/409/429/5xx and connection errors with jittered exponential
+            # backoff (honoring Retry-After) and never retries other 4xx.
+            self.client = anthropic.AsyncAnthropic(
+                api_key=self.api_key,
+                http_client=async_http_client,
+                max_retries=settings.llm_max_retries
+            )
+            logger.info("LLM service initialized with model: %s", self.model)
         except Exception as e:
-            logger.error(f"Failed to initialize Anthropic client: {e}")
+            logger.error("Failed to initialize Anthropic client: %s", e)
             raise
 
-    def _build_system_prompt(self, portfolio_context: str = None) -> str:
+    @staticmethod
+    def _build_system_prompt(portfolio_context: str = None) -> str:
         """
         Build the system prompt with optional portfolio context.
 
@@ -74,45 +174,45 @@ class LLMService:
         """
         if portfolio_context:
             # Full context for professional questions
-            system_prompt = f"""You are Anirudh Nuti. You are directly communicating with visitors on your portfolio website. Answer questions about yourself in the first person as if you are speaking directly to them.
+            return SYSTEM_PROMPT_INTRO + portfolio_context + SYSTEM_PROMPT_RULES
+        # No context - casual conversation mode
+        return CASUAL_SYSTEM_PROMPT
 
-YOUR INFORMATION:
-{portfolio_context}
-
-CRITICAL RULES - FOLLOW STRICTLY:
-1. ONLY use information explicitly stated in YOUR INFORMATION above - NEVER make up or assume details
-2. If something is not in your information, say "I don't have that information in my portfolio" - DO NOT guess or hallucinate
-3. Answer ONLY what is asked - be direct and concise
-4. Keep responses brief (2-3 sentences) unless the question specifically asks for detailed information
-5. DO NOT volunteer extra information that wasn't asked for
-6. When sharing links (email, LinkedIn, GitHub, portfolio), provide the full URL exactly as shown in your information
-
-RESPONSE GUIDELINES:
-1. Always speak in first person (I, me, my) - visitors are talking directly to YOU
-2. Be professional, friendly, and conversational
-3. For contact inquiries, provide email and LinkedIn with full URLs
-4. If asked about specific skills/projects/experience, cite relevant details from your information
-5. Use a warm but professional tone
-
-Remember: Answer ONLY what is asked. Be accurate, concise, and authentic. If you don't know something, say so - never make things up!"""
-        else:
-            # No context - casual conversation mode
-            system_prompt = """You are Anirudh Nuti. You're having a casual, friendly conversation with a visitor on your portfolio website.
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def _build_system_blocks(portfolio_context: str = None) -> Tuple[Dict, ...]:
+        """
+        Build system prompt blocks with a prompt-cache breakpoint.
 
-GUIDELINES:
-1. Always speak in first person (I, me, my) - be yourself
-2. Be warm, friendly, and personable
-3. Keep responses very brief (1-2 sentences max) for casual conversation
-4. Don't be overly formal - this is just chitchat
-5. Feel free to show personality and enthusiasm
-6. If they ask about your professional work, briefly mention you're a data engineer/full-stack developer and suggest they ask specific questions
-7. DO NOT share URLs or technical details in casual mode - save that for when they ask specific questions
+        The breakpoint sits on the portfolio context block, so the intro and
+        context are cached while the rules after it can change without
+        invalidating the (large) cached prefix. Memoized per context string.
 
-Remember: Keep it natural and SHORT. Just friendly chitchat - not a presentation!"""
+        Args:
+            portfolio_context: Formatted portfolio context from context_loader (optional)
 
-        return system_prompt
+        Returns:
+            Tuple of Anthropic system text blocks
+        """
+        if not portfolio_context:
+            return (
+                {
+                    "type": "text",
+                    "text": CASUAL_SYSTEM_PROMPT,
+                    "cache_control": {"type": "ephemeral"}
+                },
+            )
+        return (
+            {"type": "text", "text": SYSTEM_PROMPT_INTRO},
+            {
+                "type": "text",
+                "text": portfolio_context,
+                "cache_control": {"type": "ephemeral"}
+            },
+            {"type": "text", "text": SYSTEM_PROMPT_RULES},
+        )
 
-    def generate_response(
+    async def generate_response(
         self,
         user_message: str,
         portfolio_context: str,
@@ -139,49 +239,165 @@ Remember: Keep it natural and SHORT. Just friendly chitchat - not a presentation
                 "cost_usd": float
             }
         """
-        try:
-            # Build system prompt
-            system_prompt = self._build_system_prompt(portfolio_context)
-
-            # Build messages array
-            messages = []
-
-            # Add conversation history if provided
-            if conversation_history:
-                messages.extend(conversation_history)
-
-            # Add current user message
-            messages.append({
-                "role": "user",
-                "content": user_message
-            })
-
-            # Create API request parameters
-            request_params = {
-                "model": self.model,
-                "max_tokens": self.max_tokens,
-                "temperature": self.temperature,
-                "messages": messages
-            }
+        # Answers depend on the conversation so far; only first messages
+        # are shared between visitors
+        if conversation_history:
+            return await self._request_response(
+                user_message, portfolio_context, conversation_history, use_cache
+            )
 
-            # Add system prompt with caching if enabled
-            if use_cache:
-                # Use prompt caching for system context
-                # This caches the portfolio context, saving ~90% on repeated queries
-                request_params["system"] = [
-                    {
+        key = (" ".join(user_message.lower().split()), portfolio_context)
+        cached = self._response_cache.get(key)
+        if cached and (time.monotonic() - cached[1]) < self.RESPONSE_CACHE_TTL_SECONDS:
+            logger.info("Serving response from response cache")
+            return cached[0], dict(_NO_USAGE)
+
+        # Single flight: concurrent identical questions wait on one API call
+        task = self._inflight.get(key)
+        owner = task is None
+        if owner:
+            task = asyncio.ensure_future(
+                self._request_and_cache(key, user_message, portfolio_context, use_cache)
+            )
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        # Shielded so one client disconnecting does not cancel the shared call
+        response_text, usage_stats = await asyncio.shield(task)
+        if owner:
+            return response_text, usage_stats
+        # Only the request that made the call is charged for it
+        return response_text, dict(_NO_USAGE)
+
+    async def _request_and_cache(
+        self,
+        key: Tuple[str, Optional[str]],
+        user_message: str,
+        portfolio_context: Optional[str],
+        use_cache: bool
+    ) -> Tuple[str, Dict]:
+        """Call the API for a first message and remember the answer."""
+        response_text, usage_stats = await self._request_response(
+            user_message, portfolio_context, None, use_cache
+        )
+        self._response_cache.pop(key, None)
+        self._response_cache[key] = (response_text, time.monotonic())
+        # Insertion ordered, so the first key is the oldest
+        if len(self._response_cache) > self.RESPONSE_CACHE_MAX_ENTRIES:
+            del self._response_cache[next(iter(self._response_cache))]
+        return response_text, usage_stats
+
+    def _build_request_params(
+        self,
+        user_message: str,
+        portfolio_context: Optional[str],
+        conversation_history: Optional[List[Dict[str, str]]],
+        use_cache: bool
+    ) -> Dict:
+        """Build the messages API parameters for one request."""
+        # Build messages array
+        messages = []
+
+        # Add conversation history if provided, windowed to the last turns
+        if conversation_history:
+            history = conversation_history[-self.max_history_messages:]
+            # The API expects the conversation to open with a user message
+            while history and history[0]["role"] == "assistant":
+                history = history[1:]
+
+            dropped = len(conversation_history) - len(history)
+            if dropped:
+                logger.debug("Dropped %d older history messages", dropped)
+
+            messages.extend(history)
+            if use_cache and history:
+                # Sliding cache breakpoint: the system prompt plus history so
+                # far is the stable prefix of the next turn's request
+                last = history[-1]
+                messages[-1] = {
+                    "role": last["role"],
+                    "content": [{
                         "type": "text",
-                        "text": system_prompt,
+                        "text": last["content"],
                         "cache_control": {"type": "ephemeral"}
-                    }
-                ]
-            else:
-                request_params["system"] = system_prompt
+                    }]
+                }
+
+        # Add current user message
+        messages.append({
+            "role": "user",
+            "content": user_message
+        })
+
+        # Create API request parameters
+        request_params = {
+            "model": self.model,
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "messages": messages
+        }
+
+        # Add system prompt with caching if enabled
+        if use_cache:
+            # Use prompt caching for system context
+            # This caches the portfolio context, saving ~90% on repeated queries
+            request_params["system"] = list(self._build_system_blocks(portfolio_context))
+        else:
+            request_params["system"] = self._build_system_prompt(portfolio_context)
+
+        return request_params
 
-            logger.info(f"Sending request to Claude API (cache: {use_cache})")
+    def _mark_cache_used(self, portfolio_context: Optional[str], use_cache: bool):
+        """Record interactive use of a cached context for keep_cache_warm."""
+        if use_cache and portfolio_context:
+            self._cache_last_used[portfolio_context] = time.monotonic()
+
+    async def _generate_casual_locally(
+        self,
+        user_message: str,
+        portfolio_context: Optional[str],
+        conversation_history: Optional[List[Dict[str, str]]]
+    ) -> Optional[Tuple[str, Dict]]:
+        """Answer a casual turn with the local model; None to use Claude instead."""
+        if portfolio_context or self.casual_llm is None:
+            return None
+        try:
+            result = await self.casual_llm.generate(
+                CASUAL_SYSTEM_PROMPT,
+                user_message,
+                conversation_history,
+                temperature=self.temperature
+            )
+            logger.info("Casual response generated by local model (no API call)")
+            return result
+        except Exception as e:
+            logger.warning("Local casual model failed, falling back to Claude: %s", e)
+            return None
+
+    async def _request_response(
+        self,
+        user_message: str,
+        portfolio_context: Optional[str],
+        conversation_history: Optional[List[Dict[str, str]]],
+        use_cache: bool
+    ) -> Tuple[str, Dict]:
+        """Send one messages.create request and compute its usage stats."""
+        local = await self._generate_casual_locally(
+            user_message, portfolio_context, conversation_history
+        )
+        if local is not None:
+            return local
+
+        try:
+            request_params = self._build_request_params(
+                user_message, portfolio_context, conversation_history, use_cache
+            )
+            self._mark_cache_used(portfolio_context, use_cache)
+
+            logger.info("Sending request to Claude API (cache: %s)", use_cache)
 
             # Make API call
-            response = self.client.messages.create(**request_params)
+            response = await self.client.messages.create(**request_params)
 
             # Extract response text
             response_text = response.content[0].text
@@ -191,19 +407,253 @@ Remember: Keep it natural and SHORT. Just friendly chitchat - not a presentation
             usage_stats = self._calculate_usage_stats(usage)
 
             logger.info(
-                f"Response generated: {usage_stats['total_tokens']} tokens, "
-                f"${usage_stats['cost_usd']:.6f}"
+                "Response generated: %d tokens, $%.6f",
+                usage_stats["total_tokens"], usage_stats["cost_usd"]
             )
 
             return response_text, usage_stats
 
         except anthropic.APIError as e:
-            logger.error(f"Anthropic API error: {e}")
+            logger.error("Anthropic API error: %s", e)
             raise
         except Exception as e:
-            logger.error(f"Error generating response: {e}")
+            logger.error("Error generating response: %s", e)
+            raise
+
+    async def stream_response(
+        self,
+        user_message: str,
+        portfolio_context: Optional[str],
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        use_cache: bool = True,
+        usage_stats: Optional[Dict] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream a response from Claude API as it is generated.
+
+        Args:
+            user_message: User's message
+            portfolio_context: Formatted portfolio context
+            conversation_history: Previous messages (optional)
+            use_cache: Whether to use prompt caching (default: True)
+            usage_stats: Optional dict filled with the usage stats (same keys
+                as generate_response); also filled with the usage billed so
+                far if the stream is cut short
+
+        Yields:
+            Chunks of response text
+        """
+        local = await self._generate_casual_locally(
+            user_message, portfolio_context, conversation_history
+        )
+        if local is not None:
+            if usage_stats is not None:
+                usage_stats.update(local[1])
+            yield local[0]
+            return
+
+        request_params = self._build_request_params(
+            user_message, portfolio_context, conversation_history, use_cache
+        )
+        self._mark_cache_used(portfolio_context, use_cache)
+
+        logger.info("Streaming request to Claude API (cache: %s)", use_cache)
+
+        stats = dict(_NO_USAGE)
+
+        def record(usage) -> None:
+            stats.update(self._calculate_usage_stats(usage))
+            if usage_stats is not None:
+                usage_stats.update(stats)
+
+        try:
+            async with self.client.messages.stream(**request_params) as stream:
+                completed = False
+                try:
+                    async for text in stream.text_stream:
+                        if not stats["input_tokens"]:
+                            # Input is billed once the message starts; record
+                            # it before handing out text in case the consumer
+                            # never resumes this generator
+                            record(stream.current_message_snapshot.usage)
+                        yield text
+                    record((await stream.get_final_message()).usage)
+                    completed = True
+                finally:
+                    if not completed:
+                        # Cut short (client gone, cancelled or API error):
+                        # keep whatever usage has been billed so far
+                        try:
+                            record(stream.current_message_snapshot.usage)
+                        except AssertionError:
+                            pass  # Failed before the message started
+        except anthropic.APIError as e:
+            logger.error("Anthropic API error: %s", e)
             raise
 
+        logger.info(
+            "Response streamed: %d tokens, $%.6f",
+            stats["total_tokens"], stats["cost_usd"]
+        )
+
+    async def submit_batch(self, payloads: List[Dict]) -> str:
+        """
+        Submit non-interactive requests through the Message Batches API.
+
+        Batched requests are billed at half the normal token price, which
+        suits evals and smoke tests that do not need an answer right away.
+
+        Args:
+            payloads: Dicts with custom_id, user_message and optionally
+                portfolio_context, conversation_history and use_cache
+
+        Returns:
+            Batch ID to pass to poll_batch
+        """
+        requests = [
+            {
+                "custom_id": payload["custom_id"],
+                "params": self._build_request_params(
+                    payload["user_message"],
+                    payload.get("portfolio_context"),
+                    payload.get("conversation_history"),
+                    payload.get("use_cache", True)
+                )
+            }
+            for payload in payloads
+        ]
+
+        batch = await self.client.messages.batches.create(requests=requests)
+        logger.info("Submitted message batch %s (%d requests)", batch.id, len(requests))
+        return batch.id
+
+    async def poll_batch(
+        self,
+        batch_id: str,
+        poll_interval: float = 30.0
+    ) -> Dict[str, Optional[Tuple[str, Dict]]]:
+        """
+        Wait for a message batch to finish and collect its results.
+
+        Args:
+            batch_id: ID returned by submit_batch
+            poll_interval: Seconds between status checks
+
+        Returns:
+            Mapping of custom_id to (response_text, usage_stats), or None for
+            requests that errored, were canceled or expired
+        """
+        while True:
+            batch = await self.client.messages.batches.retrieve(batch_id)
+            if batch.processing_status == "ended":
+                break
+            await asyncio.sleep(poll_interval)
+
+        results = {}
+        async for entry in await self.client.messages.batches.results(batch_id):
+            if entry.result.type != "succeeded":
+                logger.warning("Batch request %s %s", entry.custom_id, entry.result.type)
+                results[entry.custom_id] = None
+                continue
+
+            message = entry.result.message
+            usage_stats = self._calculate_usage_stats(message.usage)
+            usage_stats["cost_usd"] *= self.BATCH_PRICE_FACTOR
+            results[entry.custom_id] = (message.content[0].text, usage_stats)
+
+        logger.info("Collected %d results from message batch %s", len(results), batch_id)
+        return results
+
+    async def generate_batched(
+        self,
+        questions: List[str],
+        portfolio_context: Optional[str],
+        k: int = 8
+    ) -> Tuple[List[str], Dict]:
+        """
+        Answer several questions per API call, for offline evaluation only.
+
+        Packs up to k questions into one numbered prompt and splits the
+        numbered reply back into answers, so an eval sweep makes N/k calls
+        instead of N. Larger k means fewer calls but longer replies (and
+        more risk of the model merging answers). Not for interactive chat.
+
+        Args:
+            questions: Questions to answer
+            portfolio_context: Formatted portfolio context shared by all questions
+            k: Questions per API call
+
+        Returns:
+            Tuple of (answers in question order, summed usage_stats); an
+            answer is "" if it could not be parsed from the reply
+        """
+        answers: List[str] = []
+        total_usage = dict(_NO_USAGE)
+
+        for start in range(0, len(questions), k):
+            group = questions[start:start + k]
+            prompt = "Answer each question concisely, as a numbered list.\n" + "\n".join(
+                f"{i}. {question}" for i, question in enumerate(group, 1)
+            )
+            response_text, usage_stats = await self._request_response(
+                prompt, portfolio_context, None, True
+            )
+            for key, value in usage_stats.items():
+                total_usage[key] += value
+
+            parts = [part.strip() for part in _NUMBERED_ITEM_RE.split(response_text)[1:]]
+            if len(parts) != len(group):
+                logger.warning(
+                    "Expected %d answers in batched reply, parsed %d", len(group), len(parts)
+                )
+            answers.extend((parts + [""] * len(group))[:len(group)])
+
+        return answers, total_usage
+
+    async def keep_cache_warm(
+        self,
+        window_seconds: float,
+        record_usage: Optional[Callable[[Dict], Awaitable[None]]] = None
+    ):
+        """
+        Keep the prompt cache warm for recently used portfolio contexts.
+
+        Runs until cancelled. Every CACHE_REFRESH_SECONDS, each context that
+        real traffic used within window_seconds but not since the last
+        refresh gets a 1-token request that reads (and so renews) its cached
+        prefix, sparing the next visitor a full cache write.
+
+        Args:
+            window_seconds: Stop refreshing a context after this long without
+                a real request
+            record_usage: Awaited with the usage stats of each refresh, which
+                is billed like any other request
+        """
+        while True:
+            await asyncio.sleep(self.CACHE_REFRESH_SECONDS)
+            now = time.monotonic()
+            for context, last_used in list(self._cache_last_used.items()):
+                idle = now - last_used
+                if idle > window_seconds:
+                    del self._cache_last_used[context]
+                elif idle >= self.CACHE_REFRESH_SECONDS:
+                    try:
+                        response = await self.client.messages.create(
+                            model=self.model,
+                            max_tokens=1,
+                            system=list(self._build_system_blocks(context)),
+                            messages=[{"role": "user", "content": "ping"}]
+                        )
+                        usage_stats = self._calculate_usage_stats(response.usage)
+                        logger.debug(
+                            "Refreshed prompt cache (%d chars of context, $%.6f)",
+                            len(context), usage_stats["cost_usd"]
+                        )
+                        if record_usage is not None:
+                            await record_usage(usage_stats)
+                    except Exception as e:
+                        logger.warning("Prompt cache refresh failed: %s", e)
+
     def _calculate_usage_stats(self, usage: anthropic.types.Usage) -> Dict:
         """
         Calculate cost and aggregate usage statistics.
@@ -214,19 +664,20 @@ Remember: Keep it natural and SHORT. Just friendly chitchat - not a presentation
         Returns:
             Dictionary with usage stats and cost
         """
-        # Extract token counts
-        input_tokens = getattr(usage, 'input_tokens', 0)
-        output_tokens = getattr(usage, 'output_tokens', 0)
-        cache_creation_tokens = getattr(usage, 'cache_creation_input_tokens', 0)
-        cache_read_tokens = getattr(usage, 'cache_read_input_tokens', 0)
-
-        # Calculate costs
-        input_cost = input_tokens * self.PRICING["input_tokens"]
-        output_cost = output_tokens * self.PRICING["output_tokens"]
-        cache_creation_cost = cache_creation_tokens * self.PRICING["cache_creation"]
-        cache_read_cost = cache_read_tokens * self.PRICING["cache_read"]
-
-        total_cost = input_cost + output_cost + cache_creation_cost + cache_read_cost
+        # Extract token counts (the SDK reports the cache fields as None
+        # when prompt caching did not apply)
+        input_tokens = getattr(usage, 'input_tokens', 0) or 0
+        output_tokens = getattr(usage, 'output_tokens', 0) or 0
+        cache_creation_tokens = getattr(usage, 'cache_creation_input_tokens', 0) or 0
+        cache_read_tokens = getattr(usage, 'cache_read_input_tokens', 0) or 0
+
+        # Calculate costs with the per-token prices resolved once at import
+        total_cost = (
+            input_tokens * _PRICE_INPUT
+            + output_tokens * _PRICE_OUTPUT
+            + cache_creation_tokens * _PRICE_CACHE_CREATION
+            + cache_read_tokens * _PRICE_CACHE_READ
+        )
         total_tokens = input_tokens + output_tokens + cache_creation_tokens + cache_read_tokens
 
         return {
@@ -248,25 +699,11 @@ Remember: Keep it natural and SHORT. Just friendly chitchat - not a presentation
         Returns:
             Tuple of (response_text, usage_stats)
         """
-        greeting_message = (
-            f"Hello{' ' + user_name if user_name else ''}! "
-            "I'm Anirudh. I can tell you about my professional background, "
-            "skills, experience, projects, and how to get in touch with me. "
-            "What would you like to know?"
-        )
-
-        # For greetings, we return a canned response with minimal cost
-        usage_stats = {
-            "input_tokens": 0,
-            "output_tokens": 0,
-            "cache_creation_tokens": 0,
-            "cache_read_tokens": 0,
-            "total_tokens": 0,
-            "cost_usd": 0.0
-        }
-
+        # For greetings, we return a canned response with no cost
         logger.info("Generated greeting response (no API call)")
-        return greeting_message, usage_stats
+        if not user_name:
+            return _GREETING, dict(_NO_USAGE)
+        return f"Hello {user_name}! {_GREETING_BODY}", dict(_NO_USAGE)
 
     def estimate_cost(
         self,
@@ -302,5 +739,11 @@ Remember: Keep it natural and SHORT. Just friendly chitchat - not a presentation
         return input_cost + output_cost
 
 
+# Per-token prices as plain floats for _calculate_usage_stats
+_PRICE_INPUT = LLMService.PRICING["input_tokens"]
+_PRICE_OUTPUT = LLMService.PRICING["output_tokens"]
+_PRICE_CACHE_CREATION = LLMService.PRICING["cache_creation"]
+_PRICE_CACHE_READ = LLMService.PRICING["cache_read"]
+
 # Global LLM service instance
 llm_service = LLMService()
@@ -0,0 +1,101 @@
+"""
+Local Casual LLM
+
+Optional small local model (served by Ollama) for casual conversation
+turns that need no portfolio context, so chitchat costs no API spend.
+Disabled unless OLLAMA_BASE_URL is set.
+"""
+from typing import Dict, List, Optional, Tuple
+import httpx
+from app.config import settings
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class LocalCasualLLM:
+    """Client for a local Ollama model answering casual messages."""
+
+    def __init__(
+        self,
+        base_url: str,
+        model: str,
+        max_tokens: int = 150,
+        timeout: float = 10.0
+    ):
+        """
+        Initialize local casual LLM client.
+
+        Args:
+            base_url: Ollama server URL (e.g. http://localhost:11434)
+            model: Ollama model tag
+            max_tokens: Maximum tokens in a casual reply
+            timeout: Request timeout in seconds
+        """
+        self.model = model
+        self.max_tokens = max_tokens
+        self.client = httpx.AsyncClient(base_url=base_url, timeout=timeout)
+        logger.info("Local casual LLM enabled with model: %s", model)
+
+    async def generate(
+        self,
+        system_prompt: str,
+        user_message: str,
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        temperature: float = 0.7
+    ) -> Tuple[str, Dict]:
+        """
+        Generate a casual reply with the local model.
+
+        Args:
+            system_prompt: System prompt for casual conversation
+            user_message: User's message
+            conversation_history: Previous messages (optional)
+            temperature: Sampling temperature
+
+        Returns:
+            Tuple of (response_text, usage_stats) with zero cost
+
+        Raises:
+            httpx.HTTPError: If the Ollama server is unreachable or errors
+        """
+        messages = [{"role": "system", "content": system_prompt}]
+        if conversation_history:
+            messages.extend(conversation_history)
+        messages.append({"role": "user", "content": user_message})
+
+        response = await self.client.post(
+            "/api/chat",
+            json={
+                "model": self.model,
+                "messages": messages,
+                "stream": False,
+                "options": {"num_predict": self.max_tokens, "temperature": temperature}
+            }
+        )
+        response.raise_for_status()
+        data = response.json()
+
+        input_tokens = data.get("prompt_eval_count", 0)
+        output_tokens = data.get("eval_count", 0)
+        usage_stats = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cache_creation_tokens": 0,
+            "cache_read_tokens": 0,
+            "total_tokens": input_tokens + output_tokens,
+            "cost_usd": 0.0
+        }
+        return data["message"]["content"], usage_stats
+
+    async def aclose(self):
+        """Close the HTTP connection pool."""
+        await self.client.aclose()
+
+
+# Global instance (None when no Ollama server is configured)
+local_casual_llm = (
+    LocalCasualLLM(settings.ollama_base_url, settings.ollama_casual_model)
+    if settings.ollama_base_url
+    else None
+)
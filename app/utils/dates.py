@@ -0,0 +1,48 @@
+"""
+Date Helpers
+"""
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+import time
+
+SECONDS_PER_DAY = 86400
+
+# Naive UTC epoch, matching the naive DateTime columns in the database
+_EPOCH = datetime(1970, 1, 1)
+
+
+@lru_cache(maxsize=2)
+def _day_start(epoch_day: int) -> datetime:
+    """Build the start-of-day datetime for a day number since the epoch"""
+    return _EPOCH + timedelta(days=epoch_day)
+
+
+def today_utc_start() -> datetime:
+    """
+    Get midnight UTC for the current day as a naive datetime.
+
+    The datetime is only rebuilt when the day changes; otherwise this is an
+    integer division and a cache hit.
+
+    Returns:
+        Start of the current UTC day
+    """
+    return _day_start(int(time.time()) // SECONDS_PER_DAY)
+
+
+@lru_cache(maxsize=2)
+def _second_iso(epoch_second: int) -> str:
+    """Format a whole epoch second as an aware UTC ISO 8601 string"""
+    return datetime.fromtimestamp(epoch_second, timezone.utc).isoformat()
+
+
+def utc_now_iso() -> str:
+    """
+    Get the current UTC time as an ISO 8601 string with one-second resolution.
+
+    The string is only reformatted when the second changes.
+
+    Returns:
+        Timestamp such as "2024-10-01T12:00:00+00:00"
+    """
+    return _second_iso(int(time.time()))
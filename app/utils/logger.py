@@ -5,11 +5,21 @@ import logging
 import sys
 from app.config import settings
 
+# Shared by every handler created below
+_formatter = logging.Formatter(
+    '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
 
 def setup_logger(name: str) -> logging.Logger:
     """
     Set up and configure logger
 
+    Idempotent: a logger that already has handlers is returned unchanged,
+    so repeated imports (pytest, uvicorn --reload, alembic) never stack
+    duplicate handlers.
+
     Args:
         name: Logger name (usually __name__)
 
@@ -18,6 +28,10 @@ def setup_logger(name: str) -> logging.Logger:
     """
     logger = logging.getLogger(name)
 
+    # Already configured
+    if logger.handlers:
+        return logger
+
     # Set level based on environment
     level = logging.DEBUG if settings.debug else logging.INFO
     logger.setLevel(level)
@@ -25,16 +39,9 @@ def setup_logger(name: str) -> logging.Logger:
     # Create console handler
     handler = logging.StreamHandler(sys.stdout)
     handler.setLevel(level)
-
-    # Create formatter
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    handler.setFormatter(formatter)
+    handler.setFormatter(_formatter)
 
     # Add handler to logger
-    if not logger.handlers:
-        logger.addHandler(handler)
+    logger.addHandler(handler)
 
     return logger
@@ -4,9 +4,17 @@ Simple script to test the chatbot API endpoint
 """
 import requests
 import json
+import os
 
 BASE_URL = "http://localhost:8000"
 
+# Questions sent through the Message Batches API when BATCH_MODE is set
+BATCH_QUESTIONS = [
+    "What are your Python skills?",
+    "Tell me about your recent projects",
+    "How can I contact you?",
+]
+
 def test_greeting():
     """Test greeting message"""
     print("\n=== Testing Greeting ===")
@@ -42,7 +50,71 @@ def test_session_history(session_id):
     print(f"Intents: {data['summary']['unique_intents']}")
     return data
 
+def run_batch_mode():
+    """Answer BATCH_QUESTIONS via the Message Batches API (half price, not interactive)"""
+    import asyncio
+    from app.services.intent_classifier import intent_classifier
+    from app.services.context_loader import context_loader
+    from app.services.llm_service import llm_service
+
+    print("\n=== Testing Batch Mode ===")
+    payloads = []
+    for i, question in enumerate(BATCH_QUESTIONS):
+        intents = intent_classifier.classify(question)
+        context = context_loader.get_context_for_intents(intents)
+        payloads.append({
+            "custom_id": f"question-{i}",
+            "user_message": question,
+            "portfolio_context": context or None,
+        })
+
+    async def run():
+        batch_id = await llm_service.submit_batch(payloads)
+        print(f"Submitted batch: {batch_id}")
+        return await llm_service.poll_batch(batch_id)
+
+    results = asyncio.run(run())
+    for custom_id, result in results.items():
+        if result is None:
+            print(f"{custom_id}: failed")
+            continue
+        text, usage = result
+        print(f"{custom_id}: {usage['total_tokens']} tokens, ${usage['cost_usd']:.6f}")
+        print(f"  {text[:200]}")
+    return results
+
+def run_marshaled_mode():
+    """Answer BATCH_QUESTIONS several per API call (offline evals only)"""
+    import asyncio
+    from app.services.intent_classifier import intent_classifier
+    from app.services.context_loader import context_loader
+    from app.services.llm_service import llm_service
+
+    print("\n=== Testing Row-Marshaled Mode ===")
+    intents = sorted({
+        intent for question in BATCH_QUESTIONS
+        for intent in intent_classifier.classify(question)
+    })
+    context = context_loader.get_context_for_intents(intents)
+
+    k = int(os.getenv("MARSHAL_K", "8"))
+    answers, usage = asyncio.run(
+        llm_service.generate_batched(BATCH_QUESTIONS, context or None, k=k)
+    )
+    for question, answer in zip(BATCH_QUESTIONS, answers):
+        print(f"Q: {question}")
+        print(f"A: {answer[:200]}")
+    print(f"Total: {usage['total_tokens']} tokens, ${usage['cost_usd']:.6f}")
+    return answers
+
 if __name__ == "__main__":
+    if os.getenv("BATCH_MODE"):
+        run_batch_mode()
+        raise SystemExit(0)
+    if os.getenv("MARSHAL_MODE"):
+        run_marshaled_mode()
+        raise SystemExit(0)
+
     try:
         # Test 1: Greeting (no LLM call)
         result1 = test_greeting()
@@ -0,0 +1,107 @@
+"""
+Unit tests for the chat routes
+"""
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+import pytest
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
+from app.models.schemas import ChatRequest
+from app.routes import chat
+
+
+class TestChatStream:
+    """Test suite for the streaming chat endpoint"""
+
+    @pytest.fixture
+    def day_start(self):
+        """UTC day the request is charged to"""
+        return datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+    @pytest.fixture
+    def http_request(self, day_start):
+        """Request with the day start set by the middleware"""
+        return Mock(state=SimpleNamespace(today_utc_start=day_start))
+
+    @pytest.fixture
+    def persistence(self):
+        """Patch out the turn preparation and everything the turn is recorded to"""
+        session_factory = MagicMock()
+        session_factory.return_value.__aenter__.return_value = AsyncMock()
+        turn = ("session-1", "What are your skills?", ["skills"], "skills", [])
+
+        with patch.object(chat, "_prepare_turn", AsyncMock(return_value=turn)), \
+             patch.object(chat, "_load_portfolio_context", return_value="Context"), \
+             patch.object(chat, "AsyncSessionLocal", session_factory), \
+             patch.object(chat.MessageRepository, "create_messages_bulk", AsyncMock()) as create_messages, \
+             patch.object(chat.CostTrackingRepository, "update_daily_cost", AsyncMock()) as update_cost, \
+             patch.object(chat, "_save_turn_to_history") as save_history:
+            yield SimpleNamespace(
+                create_messages=create_messages,
+                update_daily_cost=update_cost,
+                save_history=save_history
+            )
+
+    async def test_client_disconnect_still_records_cost(self, http_request, day_start, persistence):
+        """Test usage billed before a mid-stream disconnect is charged to the day"""
+        async def stream_response(usage_stats, **kwargs):
+            usage_stats.update({
+                "input_tokens": 100,
+                "output_tokens": 3,
+                "cache_read_tokens": 0,
+                "total_tokens": 103,
+                "cost_usd": 0.000345
+            })
+            yield "Python"
+            await asyncio.Event().wait()  # Generation stalls until the client leaves
+
+        first_chunk = asyncio.Event()
+
+        async def send(message):
+            if message["type"] == "http.response.body" and message.get("body"):
+                first_chunk.set()
+
+        async def receive():
+            await first_chunk.wait()
+            return {"type": "http.disconnect"}
+
+        with patch.object(chat.llm_service, "stream_response", stream_response):
+            response = await chat.chat_stream(
+                http_request, ChatRequest(message="What are your skills?"), db=AsyncMock()
+            )
+            await asyncio.wait_for(response({"type": "http"}, receive, send), timeout=5)
+
+        persistence.update_daily_cost.assert_awaited_once()
+        kw = persistence.update_daily_cost.call_args.kwargs
+        assert kw["day_start"] == day_start
+        assert kw["tokens"] == 103
+        assert kw["cost"] == 0.000345
+        # A cut-short reply is not fed back to the LLM as history
+        persistence.save_history.assert_not_called()
+
+    async def test_failure_before_text_stores_no_reply(self, http_request, day_start, persistence):
+        """Test a stream failing before any text stores no message or request"""
+        async def stream_response(usage_stats, **kwargs):
+            usage_stats.update({"total_tokens": 100, "cost_usd": 0.0003})
+            raise RuntimeError("API unavailable")
+            yield  # Makes this an async generator
+
+        async def send(message):
+            pass
+
+        async def receive():
+            await asyncio.Event().wait()
+
+        with patch.object(chat.llm_service, "stream_response", stream_response):
+            response = await chat.chat_stream(
+                http_request, ChatRequest(message="What are your skills?"), db=AsyncMock()
+            )
+            await asyncio.wait_for(response({"type": "http"}, receive, send), timeout=5)
+
+        persistence.create_messages.assert_not_awaited()
+        # Billed input is still charged, without counting a request
+        persistence.update_daily_cost.assert_awaited_once()
+        kw = persistence.update_daily_cost.call_args.kwargs
+        assert kw["day_start"] == day_start
+        assert kw["cost"] == 0.0003
+        assert kw["count_request"] is False
@@ -167,6 +167,15 @@ class TestContextLoader:
         # Should include both contexts
         assert "SKILLS" in context or "EXPERIENCE" in context
 
+    def test_formatted_context_cache(self, loader):
+        """Test formatted context is reused and dropped with its source file"""
+        context1 = loader.get_context_for_intents(["skills"], use_cache=True)
+        context2 = loader.get_context_for_intents(["skills"], use_cache=True)
+        assert context1 is context2
+
+        loader.clear_cache("skills")
+        assert len(loader._formatted_cache) == 0
+
     def test_clear_specific_cache(self, loader):
         """Test clearing cache for specific file"""
         # Load and cache
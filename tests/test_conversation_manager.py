@@ -149,6 +149,20 @@ class TestConversationManagerMemory:
         assert "timestamp" not in llm_history[0]
         assert "metadata" not in llm_history[0]
 
+    def test_format_history_token_budget(self, manager):
+        """Test that the token budget drops the oldest messages first"""
+        session_id = "test-session-budget"
+
+        manager.add_message(session_id, "user", "x" * 4000)
+        manager.add_message(session_id, "assistant", "Long answer")
+        manager.add_message(session_id, "user", "Short question")
+        manager.add_message(session_id, "assistant", "Short answer")
+
+        llm_history = manager.format_history_for_llm(session_id, max_tokens=100)
+
+        assert [m["content"] for m in llm_history] == ["Short question", "Short answer"]
+        assert llm_history[0]["role"] == "user"
+
     def test_get_context_summary(self, manager):
         """Test getting context summary"""
         session_id = "test-session-9"
@@ -237,6 +251,35 @@ class TestConversationManagerMemory:
         assert history_a[0]["content"] == "Message A1"
         assert history_b[0]["content"] == "Message B1"
 
+    def test_memory_sessions_expire_and_are_capped(self, manager):
+        """Test the in-memory store honors the session TTL and session cap"""
+        manager.add_message("old", "user", "Hi")
+        manager._memory_expires["old"] = 0.0  # Already expired
+
+        assert not manager.session_exists("old")
+        assert manager.get_history("old") == []
+
+        manager.MEMORY_MAX_SESSIONS = 2
+        for session_id in ("a", "b", "c"):
+            manager.add_message(session_id, "user", "Hi")
+
+        assert list(manager._memory_store) == ["b", "c"]
+        assert not manager.session_exists("a")
+
+    def test_memory_store_at_cap_evicts_oldest_session(self, manager):
+        """Test writes to a full in-memory store drop only the oldest session"""
+        for i in range(manager.MEMORY_MAX_SESSIONS):
+            manager.add_message(f"session-{i}", "user", "Hi")
+
+        # Writing to an existing session moves it to the back of the queue
+        manager.add_message("session-0", "assistant", "Hello")
+        manager.add_message("session-new", "user", "Hi")
+
+        assert len(manager._memory_store) == manager.MEMORY_MAX_SESSIONS
+        assert not manager.session_exists("session-1")
+        assert len(manager.get_history("session-0")) == 2
+        assert next(iter(manager._memory_expires)) == "session-2"
+
 
 class TestConversationManagerRedis:
     """Test suite for ConversationManager with Redis (mocked)"""
@@ -254,7 +297,7 @@ class TestConversationManagerRedis:
             mock_client.lrange.return_value = []
             mock_client.delete.return_value = 1
             mock_client.exists.return_value = 0
-            mock_client.keys.return_value = []
+            mock_client.scan_iter.return_value = iter([])
 
             mock_redis_from_url.return_value = mock_client
 
@@ -281,14 +324,30 @@ class TestConversationManagerRedis:
         )
 
         assert success is True
-        # Verify Redis methods were called
-        assert manager.redis_client.rpush.called
-        assert manager.redis_client.ltrim.called
-        assert manager.redis_client.expire.called
+        # Verify the append script ran once with the trim length and TTL
+        script = manager.redis_client.register_script.return_value
+        script.assert_called_once()
+        _, kwargs = script.call_args
+        assert kwargs["keys"] == ["chat:session:test-session:history"]
+        assert kwargs["args"][1:] == [10, 24 * 3600]
+
+    def test_get_history_redis(self, manager):
+        """Test reading history stored as JSON bytes in Redis"""
+        manager.redis_client.lrange.return_value = [
+            b'{"role":"user","content":"Hello","timestamp":"t","metadata":{}}'
+        ]
+
+        history = manager.get_history("test-session")
+
+        assert history == [
+            {"role": "user", "content": "Hello", "timestamp": "t", "metadata": {}}
+        ]
 
     def test_get_session_stats_redis(self, manager):
         """Test getting session stats with Redis"""
-        manager.redis_client.keys.return_value = ["chat:session:1:history", "chat:session:2:history"]
+        manager.redis_client.scan_iter.return_value = iter(
+            [b"chat:session:1:history", b"chat:session:2:history"]
+        )
 
         stats = manager.get_session_stats()
 
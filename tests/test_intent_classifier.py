@@ -2,6 +2,7 @@
 Unit tests for Intent Classification Service
 """
 import pytest
+from unittest.mock import Mock
 from app.services.intent_classifier import IntentClassifier
 
 
@@ -169,6 +170,47 @@ class TestIntentClassifier:
         intents = classifier.classify("   ")
         assert intents == ["general"]
 
+    def test_greeting_fast_path(self, classifier):
+        """Test bare greetings and small talk skip the LLM classifier"""
+        classifier.client = Mock()
+
+        assert classifier.classify("Hello!") == ["greeting"]
+        assert classifier.classify("good morning") == ["greeting"]
+        assert classifier.classify("Thanks.") == ["normal"]
+        classifier.client.messages.create.assert_not_called()
+
+    def test_keyword_classification_memoized(self, classifier):
+        """Test repeated messages reuse the keyword result without sharing it"""
+        first = classifier.classify_with_keywords("What projects have you built?")
+        first.append("mutated")
+        second = classifier.classify_with_keywords("What projects have you built?")
+
+        assert "projects" in second
+        assert "mutated" not in second
+        assert classifier._keyword_intents.cache_info().hits >= 1
+
+    def test_llm_classification_cached(self, classifier):
+        """Test repeated messages reuse the LLM classification"""
+        classifier.client = Mock()
+        classifier.client.messages.create.return_value.content = [Mock(text="skills,general")]
+
+        assert classifier.classify_with_llm("What tools do you use?") == ["skills", "general"]
+        assert classifier.classify_with_llm("what tools  do you use?") == ["skills", "general"]
+        classifier.client.messages.create.assert_called_once()
+
+    def test_confident_keywords_skip_llm(self, classifier):
+        """Test clear portfolio questions skip the LLM but vague ones do not"""
+        classifier.use_llm = True
+        classifier.client = Mock()
+        classifier.client.messages.create.return_value.content = [Mock(text="general")]
+
+        intents = classifier.classify("What python and sql tools do you know?")
+        assert intents[0] == "skills"
+        classifier.client.messages.create.assert_not_called()
+
+        classifier.classify("Where did you work?")
+        classifier.client.messages.create.assert_called_once()
+
     def test_case_insensitivity(self, classifier):
         """Test that classification is case-insensitive"""
         messages = [
@@ -1,20 +1,54 @@
 """
 Unit tests for LLM Service
 """
+import asyncio
+import time
+from types import SimpleNamespace
+
 import pytest
-from unittest.mock import Mock, patch, MagicMock
+from unittest.mock import AsyncMock, Mock, patch, MagicMock
+from app.config import settings
 from app.services.llm_service import LLMService
 import anthropic
 
 
+# Expected estimate_cost(1000 input, 200 output) keyed by (use_cache, cache_hit):
+# input at the normal, cache-write or cache-read rate, plus output at $4.00/M
+EXPECTED_COST = {
+    (False, False): (1000 * 0.80 / 1_000_000) + (200 * 4.00 / 1_000_000),  # Normal input
+    (True, False): (1000 * 1.00 / 1_000_000) + (200 * 4.00 / 1_000_000),   # Cache creation
+    (True, True): (1000 * 0.08 / 1_000_000) + (200 * 4.00 / 1_000_000),    # Cache read (90% off)
+}
+
+
+def _make_response(
+    text,
+    input_tokens=0,
+    output_tokens=0,
+    cache_creation_input_tokens=0,
+    cache_read_input_tokens=0
+):
+    """Build a stand-in for an Anthropic Message (plain attributes, no Mock)"""
+    return SimpleNamespace(
+        content=[SimpleNamespace(text=text)],
+        usage=SimpleNamespace(
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            cache_creation_input_tokens=cache_creation_input_tokens,
+            cache_read_input_tokens=cache_read_input_tokens
+        )
+    )
+
+
 class TestLLMService:
     """Test suite for LLMService"""
 
     @pytest.fixture
     def mock_anthropic_client(self):
         """Create a mocked Anthropic client"""
-        with patch('anthropic.Anthropic') as mock_client_class:
+        with patch('anthropic.AsyncAnthropic') as mock_client_class:
             mock_client = Mock()
+            mock_client.messages.create = AsyncMock()
             mock_client_class.return_value = mock_client
             yield mock_client
 
@@ -35,6 +69,13 @@ class TestLLMService:
         assert service.temperature == 0.7
         assert service.client is not None
 
+    def test_client_retries_transient_errors(self, mock_anthropic_client):
+        """Test the client is built with the configured retry budget"""
+        with patch('anthropic.AsyncAnthropic') as mock_client_class:
+            LLMService(api_key="test-api-key")
+
+        assert mock_client_class.call_args.kwargs["max_retries"] == settings.llm_max_retries
+
     def test_pricing_constants(self):
         """Test pricing constants are defined"""
         assert LLMService.PRICING["input_tokens"] > 0
@@ -70,72 +111,44 @@ class TestLLMService:
         assert "John" in response
         assert "Anirudh" in response
 
-    def test_calculate_usage_stats_basic(self, service):
-        """Test basic usage statistics calculation"""
-        mock_usage = Mock()
-        mock_usage.input_tokens = 1000
-        mock_usage.output_tokens = 200
-        mock_usage.cache_creation_input_tokens = 0
-        mock_usage.cache_read_input_tokens = 0
-
-        stats = service._calculate_usage_stats(mock_usage)
-
-        assert stats["input_tokens"] == 1000
-        assert stats["output_tokens"] == 200
-        assert stats["total_tokens"] == 1200
-        assert stats["cost_usd"] > 0
-
-    def test_calculate_usage_stats_with_cache(self, service):
-        """Test usage statistics with cache"""
-        mock_usage = Mock()
-        mock_usage.input_tokens = 100
-        mock_usage.output_tokens = 200
-        mock_usage.cache_creation_input_tokens = 500
-        mock_usage.cache_read_input_tokens = 1000
+    @pytest.mark.parametrize(
+        "input_tokens, output_tokens, cache_creation, cache_read, expected_total",
+        [
+            (1000, 200, 0, 0, 1200),     # No caching
+            (100, 200, 500, 1000, 1800),  # Cache write and read
+        ]
+    )
+    def test_calculate_usage_stats(
+        self, service, input_tokens, output_tokens, cache_creation, cache_read, expected_total
+    ):
+        """Test usage statistics calculation, with and without cache tokens"""
+        usage = SimpleNamespace(
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            cache_creation_input_tokens=cache_creation,
+            cache_read_input_tokens=cache_read
+        )
 
-        stats = service._calculate_usage_stats(mock_usage)
+        stats = service._calculate_usage_stats(usage)
 
-        assert stats["cache_creation_tokens"] == 500
-        assert stats["cache_read_tokens"] == 1000
-        assert stats["total_tokens"] == 1800
+        assert stats["input_tokens"] == input_tokens
+        assert stats["output_tokens"] == output_tokens
+        assert stats["cache_creation_tokens"] == cache_creation
+        assert stats["cache_read_tokens"] == cache_read
+        assert stats["total_tokens"] == expected_total
         # Cost should include cache costs
         assert stats["cost_usd"] > 0
 
-    def test_estimate_cost_no_cache(self, service):
-        """Test cost estimation without cache"""
-        cost = service.estimate_cost(
-            input_tokens=1000,
-            output_tokens=200,
-            use_cache=False
-        )
-        assert cost > 0
-        # Should be roughly: 1000 * 0.80/1M + 200 * 4.00/1M
-        expected = (1000 * 0.80 / 1_000_000) + (200 * 4.00 / 1_000_000)
-        assert abs(cost - expected) < 0.000001
-
-    def test_estimate_cost_with_cache_miss(self, service):
-        """Test cost estimation with cache creation"""
-        cost = service.estimate_cost(
-            input_tokens=1000,
-            output_tokens=200,
-            use_cache=True,
-            cache_hit=False
-        )
-        # Cache creation costs $1.00 per million tokens
-        expected = (1000 * 1.00 / 1_000_000) + (200 * 4.00 / 1_000_000)
-        assert abs(cost - expected) < 0.000001
-
-    def test_estimate_cost_with_cache_hit(self, service):
-        """Test cost estimation with cache hit"""
+    @pytest.mark.parametrize("use_cache, cache_hit", list(EXPECTED_COST))
+    def test_estimate_cost(self, service, use_cache, cache_hit):
+        """Test cost estimation without cache, on a cache miss and on a cache hit"""
         cost = service.estimate_cost(
             input_tokens=1000,
             output_tokens=200,
-            use_cache=True,
-            cache_hit=True
+            use_cache=use_cache,
+            cache_hit=cache_hit
         )
-        # Cache read costs $0.08 per million tokens (90% discount)
-        expected = (1000 * 0.08 / 1_000_000) + (200 * 4.00 / 1_000_000)
-        assert abs(cost - expected) < 0.000001
+        assert abs(cost - EXPECTED_COST[(use_cache, cache_hit)]) < 0.000001
 
     def test_cache_read_cheaper_than_normal(self, service):
         """Test that cache reads are significantly cheaper"""
@@ -148,21 +161,15 @@ class TestLLMService:
         # But output cost is the same, so overall discount is less than 50%
         assert cache_hit_cost < normal_cost * 0.8  # At least 20% cheaper overall
 
-    def test_generate_response_basic(self, service, mock_anthropic_client):
+    async def test_generate_response_basic(self, service, mock_anthropic_client):
         """Test basic response generation"""
         # Mock API response
-        mock_response = Mock()
-        mock_response.content = [Mock(text="I have expertise in Python, SQL, and PySpark.")]
-        mock_response.usage = Mock(
-            input_tokens=500,
-            output_tokens=100,
-            cache_creation_input_tokens=0,
-            cache_read_input_tokens=0
+        mock_anthropic_client.messages.create.return_value = _make_response(
+            "I have expertise in Python, SQL, and PySpark.", input_tokens=500, output_tokens=100
         )
-        mock_anthropic_client.messages.create.return_value = mock_response
 
         # Generate response
-        response_text, usage_stats = service.generate_response(
+        response_text, usage_stats = await service.generate_response(
             user_message="What are your skills?",
             portfolio_context="Anirudh has skills in Python, SQL, PySpark",
             use_cache=False
@@ -173,24 +180,18 @@ class TestLLMService:
         assert usage_stats["output_tokens"] == 100
         assert usage_stats["cost_usd"] > 0
 
-    def test_generate_response_with_history(self, service, mock_anthropic_client):
+    async def test_generate_response_with_history(self, service, mock_anthropic_client):
         """Test response generation with conversation history"""
-        mock_response = Mock()
-        mock_response.content = [Mock(text="I worked at Nidhi AI as a Founding Engineer.")]
-        mock_response.usage = Mock(
-            input_tokens=600,
-            output_tokens=120,
-            cache_creation_input_tokens=0,
-            cache_read_input_tokens=0
+        mock_anthropic_client.messages.create.return_value = _make_response(
+            "I worked at Nidhi AI as a Founding Engineer.", input_tokens=600, output_tokens=120
         )
-        mock_anthropic_client.messages.create.return_value = mock_response
 
         conversation_history = [
             {"role": "user", "content": "Tell me about yourself"},
             {"role": "assistant", "content": "I'm a data engineer..."}
         ]
 
-        response_text, usage_stats = service.generate_response(
+        response_text, usage_stats = await service.generate_response(
             user_message="Where do you work?",
             portfolio_context="Anirudh works at Nidhi AI",
             conversation_history=conversation_history,
@@ -198,40 +199,37 @@ class TestLLMService:
         )
 
         # Verify messages were passed correctly
-        call_args = mock_anthropic_client.messages.create.call_args
-        messages = call_args.kwargs["messages"]
+        kw = mock_anthropic_client.messages.create.call_args.kwargs
+        messages = kw["messages"]
         assert len(messages) == 3  # 2 history + 1 new
         assert messages[0]["content"] == "Tell me about yourself"
         assert messages[2]["content"] == "Where do you work?"
 
-    def test_generate_response_with_cache(self, service, mock_anthropic_client):
+    async def test_generate_response_with_cache(self, service, mock_anthropic_client):
         """Test response generation with caching enabled"""
-        mock_response = Mock()
-        mock_response.content = [Mock(text="Response text")]
-        mock_response.usage = Mock(
-            input_tokens=100,
-            output_tokens=50,
-            cache_creation_input_tokens=500,
-            cache_read_input_tokens=0
+        mock_anthropic_client.messages.create.return_value = _make_response(
+            "Response text", input_tokens=100, output_tokens=50, cache_creation_input_tokens=500
         )
-        mock_anthropic_client.messages.create.return_value = mock_response
 
-        response_text, usage_stats = service.generate_response(
+        response_text, usage_stats = await service.generate_response(
             user_message="Test question",
             portfolio_context="Test context",
             use_cache=True
         )
 
         # Verify cache was enabled in request
-        call_args = mock_anthropic_client.messages.create.call_args
-        system_param = call_args.kwargs["system"]
+        kw = mock_anthropic_client.messages.create.call_args.kwargs
+        system_param = kw["system"]
         assert isinstance(system_param, list)
-        assert system_param[0]["cache_control"]["type"] == "ephemeral"
+        # The cache breakpoint sits on the portfolio context block
+        assert system_param[1]["text"] == "Test context"
+        assert system_param[1]["cache_control"]["type"] == "ephemeral"
+        assert "cache_control" not in system_param[-1]
 
         # Verify cache creation tokens tracked
         assert usage_stats["cache_creation_tokens"] == 500
 
-    def test_generate_response_api_error(self, service, mock_anthropic_client):
+    async def test_generate_response_api_error(self, service, mock_anthropic_client):
         """Test error handling for API errors"""
         # Create a proper APIError with required arguments
         mock_request = Mock()
@@ -242,40 +240,288 @@ class TestLLMService:
         )
 
         with pytest.raises(anthropic.APIError):
-            service.generate_response(
+            await service.generate_response(
                 user_message="Test",
                 portfolio_context="Context"
             )
 
-    def test_generate_response_generic_error(self, service, mock_anthropic_client):
+    async def test_generate_response_generic_error(self, service, mock_anthropic_client):
         """Test error handling for generic errors"""
         mock_anthropic_client.messages.create.side_effect = Exception("Unknown error")
 
         with pytest.raises(Exception):
-            service.generate_response(
+            await service.generate_response(
                 user_message="Test",
                 portfolio_context="Context"
             )
 
-    def test_model_parameters_passed_correctly(self, service, mock_anthropic_client):
+    async def test_model_parameters_passed_correctly(self, service, mock_anthropic_client):
         """Test that model parameters are passed to API"""
-        mock_response = Mock()
-        mock_response.content = [Mock(text="Response")]
-        mock_response.usage = Mock(
+        mock_anthropic_client.messages.create.return_value = _make_response(
+            "Response", input_tokens=100, output_tokens=50
+        )
+
+        await service.generate_response(
+            user_message="Test",
+            portfolio_context="Context",
+            use_cache=False
+        )
+
+        kw = mock_anthropic_client.messages.create.call_args.kwargs
+        assert kw["model"] == "claude-3-5-haiku-20241022"
+        assert kw["max_tokens"] == 1000
+        assert kw["temperature"] == 0.7
+
+    async def test_keep_cache_warm_refreshes_idle_context(self, service, mock_anthropic_client):
+        """Test idle contexts inside the window get a 1-token cache refresh"""
+        now = time.monotonic()
+        service._cache_last_used = {
+            "idle context": now - service.CACHE_REFRESH_SECONDS,
+            "recent context": now,
+            "stale context": now - 7200,
+        }
+
+        mock_anthropic_client.messages.create.return_value = _make_response(
+            "", input_tokens=10, output_tokens=1, cache_read_input_tokens=1000
+        )
+        record_usage = AsyncMock()
+
+        with patch("asyncio.sleep", side_effect=[None, asyncio.CancelledError()]):
+            with pytest.raises(asyncio.CancelledError):
+                await service.keep_cache_warm(window_seconds=3600, record_usage=record_usage)
+
+        mock_anthropic_client.messages.create.assert_called_once()
+        kw = mock_anthropic_client.messages.create.call_args.kwargs
+        assert kw["max_tokens"] == 1
+        assert kw["system"][1]["text"] == "idle context"
+        assert "stale context" not in service._cache_last_used
+        # The refresh is billed, so its cost is recorded
+        record_usage.assert_awaited_once()
+        usage_stats = record_usage.call_args.args[0]
+        assert usage_stats["cache_read_tokens"] == 1000
+        assert usage_stats["cost_usd"] > 0
+
+    def test_calculate_usage_stats_without_cache_fields(self, service):
+        """Test usage stats when the SDK reports no cache token counts"""
+        mock_usage = Mock(
+            input_tokens=1000,
+            output_tokens=200,
+            cache_creation_input_tokens=None,
+            cache_read_input_tokens=None
+        )
+
+        stats = service._calculate_usage_stats(mock_usage)
+
+        assert stats["cache_read_tokens"] == 0
+        assert stats["total_tokens"] == 1200
+        assert abs(stats["cost_usd"] - service.estimate_cost(1000, 200)) < 1e-9
+
+    async def test_identical_first_messages_share_one_call(self, service, mock_anthropic_client):
+        """Test concurrent and repeated first messages reuse one API call"""
+        mock_anthropic_client.messages.create.return_value = _make_response(
+            "I know Python.", input_tokens=100, output_tokens=20
+        )
+
+        first, second = await asyncio.gather(
+            service.generate_response("What are your skills?", "Context"),
+            service.generate_response("what are your  skills?", "Context"),
+        )
+        third = await service.generate_response("What are your skills?", "Context")
+
+        mock_anthropic_client.messages.create.assert_called_once()
+        assert first[0] == second[0] == third[0] == "I know Python."
+        assert first[1]["cost_usd"] > 0
+        assert second[1]["cost_usd"] == 0.0
+        assert third[1]["total_tokens"] == 0
+
+    async def test_stream_response_yields_text_and_usage(self, service, mock_anthropic_client):
+        """Test streamed chunks are forwarded and usage is filled in at the end"""
+        async def text_stream():
+            for chunk in ("Hello", " there"):
+                yield chunk
+
+        mock_usage = Mock(
             input_tokens=100,
             output_tokens=50,
             cache_creation_input_tokens=0,
-            cache_read_input_tokens=0
+            cache_read_input_tokens=80
         )
-        mock_anthropic_client.messages.create.return_value = mock_response
+        self._mock_stream(mock_anthropic_client, text_stream(), mock_usage)
+
+        usage_stats = {}
+        chunks = [
+            chunk async for chunk in service.stream_response(
+                user_message="Hi",
+                portfolio_context="Context",
+                usage_stats=usage_stats
+            )
+        ]
 
-        service.generate_response(
-            user_message="Test",
+        assert chunks == ["Hello", " there"]
+        assert usage_stats["output_tokens"] == 50
+        assert usage_stats["cache_read_tokens"] == 80
+        kw = mock_anthropic_client.messages.stream.call_args.kwargs
+        assert kw["messages"] == [{"role": "user", "content": "Hi"}]
+        assert isinstance(kw["system"], list)
+
+    async def test_stream_response_records_usage_when_cut_short(self, service, mock_anthropic_client):
+        """Test usage billed so far is reported when the consumer stops early"""
+        async def text_stream():
+            yield "Hello"
+            yield " there"
+
+        mock_stream = self._mock_stream(
+            mock_anthropic_client, text_stream(), Mock(), snapshot_output_tokens=1
+        )
+
+        usage_stats = {}
+        stream = service.stream_response(
+            user_message="Hi",
             portfolio_context="Context",
-            use_cache=False
+            usage_stats=usage_stats
+        )
+        assert await stream.__anext__() == "Hello"
+        # Input is recorded before the first chunk is handed out
+        assert usage_stats["input_tokens"] == 100
+
+        mock_stream.current_message_snapshot.usage.output_tokens = 5
+        await stream.aclose()  # Client disconnected
+
+        assert usage_stats["output_tokens"] == 5
+        assert usage_stats["cost_usd"] > 0
+        mock_stream.get_final_message.assert_not_awaited()
+
+    @staticmethod
+    def _mock_stream(mock_anthropic_client, text_stream, final_usage, snapshot_output_tokens=0):
+        """Make messages.stream() yield text_stream and report usage like the SDK"""
+        mock_stream = Mock()
+        mock_stream.text_stream = text_stream
+        # Snapshot after message_start: input known, output still growing
+        mock_stream.current_message_snapshot = SimpleNamespace(usage=SimpleNamespace(
+            input_tokens=100,
+            output_tokens=snapshot_output_tokens,
+            cache_creation_input_tokens=0,
+            cache_read_input_tokens=0
+        ))
+        mock_stream.get_final_message = AsyncMock(return_value=Mock(usage=final_usage))
+
+        stream_manager = MagicMock()
+        stream_manager.__aenter__.return_value = mock_stream
+        stream_manager.__aexit__.return_value = False
+        mock_anthropic_client.messages.stream = Mock(return_value=stream_manager)
+        return mock_stream
+
+    async def test_submit_and_poll_batch(self, service, mock_anthropic_client):
+        """Test batch submission builds request params and results are discounted"""
+        batches = mock_anthropic_client.messages.batches
+        batches.create = AsyncMock(return_value=Mock(id="batch-1"))
+        batches.retrieve = AsyncMock(side_effect=[
+            Mock(processing_status="in_progress"),
+            Mock(processing_status="ended"),
+        ])
+
+        succeeded = Mock(custom_id="q-0")
+        succeeded.result.type = "succeeded"
+        succeeded.result.message = _make_response("Answer", input_tokens=100, output_tokens=50)
+        errored = Mock(custom_id="q-1")
+        errored.result.type = "errored"
+
+        async def entries():
+            for entry in (succeeded, errored):
+                yield entry
+
+        batches.results = AsyncMock(return_value=entries())
+
+        batch_id = await service.submit_batch([
+            {"custom_id": "q-0", "user_message": "Skills?", "portfolio_context": "Context"},
+            {"custom_id": "q-1", "user_message": "Projects?"},
+        ])
+        results = await service.poll_batch(batch_id, poll_interval=0)
+
+        assert batch_id == "batch-1"
+        requests = batches.create.call_args.kwargs["requests"]
+        assert [r["custom_id"] for r in requests] == ["q-0", "q-1"]
+        assert requests[0]["params"]["messages"] == [{"role": "user", "content": "Skills?"}]
+
+        text, usage_stats = results["q-0"]
+        assert text == "Answer"
+        full_cost = service.estimate_cost(100, 50)
+        assert usage_stats["cost_usd"] == pytest.approx(full_cost * LLMService.BATCH_PRICE_FACTOR)
+        assert results["q-1"] is None
+        # Batch traffic does not keep the interactive prompt cache warm
+        assert service._cache_last_used == {}
+
+    def test_history_windowed_with_cache_breakpoint(self, service):
+        """Test long histories are trimmed and the newest turn carries the breakpoint"""
+        service.max_history_messages = 4
+        history = []
+        for i in range(5):
+            history.append({"role": "user", "content": f"Question {i}"})
+            history.append({"role": "assistant", "content": f"Answer {i}"})
+
+        params = service._build_request_params("Next", "Context", history, use_cache=True)
+
+        messages = params["messages"]
+        assert len(messages) == 5  # 4 history + 1 new
+        assert messages[0] == {"role": "user", "content": "Question 3"}
+        assert messages[3]["content"][0]["text"] == "Answer 4"
+        assert messages[3]["content"][0]["cache_control"] == {"type": "ephemeral"}
+        assert messages[4] == {"role": "user", "content": "Next"}
+        # Caller's history is not modified
+        assert history[-1] == {"role": "assistant", "content": "Answer 4"}
+
+    async def test_casual_turn_uses_local_model(self, service, mock_anthropic_client):
+        """Test casual turns go to the local model and fall back to Claude on failure"""
+        local_usage = {
+            "input_tokens": 20, "output_tokens": 10, "cache_creation_tokens": 0,
+            "cache_read_tokens": 0, "total_tokens": 30, "cost_usd": 0.0
+        }
+        service.casual_llm = Mock()
+        service.casual_llm.generate = AsyncMock(return_value=("Doing great!", local_usage))
+
+        response_text, usage_stats = await service.generate_response(
+            user_message="How are you?",
+            portfolio_context=None
+        )
+
+        assert response_text == "Doing great!"
+        assert usage_stats["cost_usd"] == 0.0
+        mock_anthropic_client.messages.create.assert_not_called()
+
+        # Portfolio questions still go to Claude
+        mock_anthropic_client.messages.create.return_value = _make_response(
+            "Python", input_tokens=10, output_tokens=5
+        )
+        response_text, _ = await service.generate_response(
+            user_message="Skills?",
+            portfolio_context="Context"
+        )
+        assert response_text == "Python"
+        service.casual_llm.generate.assert_awaited_once()
+
+        # Local failures fall back to Claude
+        service.casual_llm.generate.side_effect = ConnectionError("ollama down")
+        response_text, _ = await service.generate_response(
+            user_message="What's up?",
+            portfolio_context=None
+        )
+        assert response_text == "Python"
+
+    async def test_generate_batched_splits_numbered_reply(self, service, mock_anthropic_client):
+        """Test questions are packed k per call and answers split back out"""
+        mock_anthropic_client.messages.create.side_effect = [
+            _make_response(
+                "1. Python and SQL.\n2) Airflow pipelines.", input_tokens=100, output_tokens=20
+            ),
+            _make_response("1. Email me.", input_tokens=100, output_tokens=20),
+        ]
+
+        answers, usage_stats = await service.generate_batched(
+            ["Skills?", "Projects?", "Contact?"], "Context", k=2
         )
 
-        call_args = mock_anthropic_client.messages.create.call_args
-        assert call_args.kwargs["model"] == "claude-3-5-haiku-20241022"
-        assert call_args.kwargs["max_tokens"] == 1000
-        assert call_args.kwargs["temperature"] == 0.7
+        assert answers == ["Python and SQL.", "Airflow pipelines.", "Email me."]
+        assert mock_anthropic_client.messages.create.call_count == 2
+        kw = mock_anthropic_client.messages.create.call_args_list[0].kwargs
+        assert "1. Skills?\n2. Projects?" in kw["messages"][-1]["content"]
+        assert usage_stats["input_tokens"] == 200
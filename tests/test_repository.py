@@ -0,0 +1,27 @@
+"""
+Unit tests for the database repository layer
+"""
+from unittest.mock import AsyncMock, Mock
+from app.db.repository import MessageRepository
+from app.db.session import has_pending_writes
+
+
+class TestMessageRepository:
+    """Test suite for MessageRepository"""
+
+    async def test_copy_messages_marks_session_as_written(self):
+        """Test rows loaded with COPY are committed by get_db"""
+        driver_connection = Mock(copy_records_to_table=AsyncMock(return_value="COPY 1"))
+        connection = Mock(get_raw_connection=AsyncMock(
+            return_value=Mock(driver_connection=driver_connection)
+        ))
+        db = Mock(info={}, new=(), dirty=(), deleted=())
+        db.connection = AsyncMock(return_value=connection)
+        records = [("session-1", "user", "Hi", "greeting", 0, 0.0)]
+
+        await MessageRepository.copy_messages(db, records)
+
+        driver_connection.copy_records_to_table.assert_awaited_once_with(
+            "messages", records=records, columns=MessageRepository.COPY_COLUMNS
+        )
+        assert has_pending_writes(db)